@@ -0,0 +1,95 @@
+import argparse
+import os
+from config import EXPORT_DIR
+
+try:
+    import numpy as np
+    import pandas as pd
+    import pyarrow.dataset as ds
+except ImportError:
+    ds = None
+
+DISTANCE_BINS = (0, 100, 250, 500, 1000, 2000, 4000, float('inf'))
+BATCH_ROWS = 1000000
+
+class KillAnalytics:
+    """Vectorized reports over the Parquet kills export.
+
+    Each report streams the dataset in record batches, reading only the
+    columns it needs and reducing every batch to a small partial aggregate,
+    so memory stays bounded however many kills have been exported.
+    """
+
+    def __init__(self, export_dir=EXPORT_DIR):
+        if ds is None:
+            raise RuntimeError("Analytics needs pyarrow, pandas and numpy: pip install pyarrow pandas numpy")
+        self.export_dir = export_dir
+        self.kills = ds.dataset(os.path.join(export_dir, 'kills'), format='parquet', partitioning='hive')
+
+    def _batches(self, columns, filter=None):
+        for batch in self.kills.to_batches(columns=columns, filter=filter, batch_size=BATCH_ROWS):
+            yield batch.to_pandas()
+
+    def leaderboard(self, limit=10):
+        kills = pd.Series(dtype='int64')
+        deaths = pd.Series(dtype='int64')
+        headshots = pd.Series(dtype='int64')
+        for df in self._batches(['attacker_steam_id', 'victim_steam_id', 'headshot']):
+            deaths = deaths.add(df['victim_steam_id'].value_counts(), fill_value=0)
+            df = df[df['attacker_steam_id'] != df['victim_steam_id']]
+            kills = kills.add(df['attacker_steam_id'].value_counts(), fill_value=0)
+            headshots = headshots.add(df.groupby('attacker_steam_id')['headshot'].sum(), fill_value=0)
+
+        board = pd.DataFrame({'kills': kills, 'deaths': deaths, 'headshots': headshots}).fillna(0).astype('int64')
+        board['kd'] = board['kills'] / board['deaths'].replace(0, np.nan)
+        board['headshot_rate'] = board['headshots'] / board['kills'].replace(0, np.nan)
+        players_path = os.path.join(self.export_dir, 'players', 'players.parquet')
+        if os.path.exists(players_path):
+            names = pd.read_parquet(players_path, columns=['steam_id', 'player_name']).set_index('steam_id')
+            board = board.join(names)
+        return board.sort_values('kills', ascending=False).head(limit)
+
+    def weapon_meta(self, freq='W'):
+        """Kills per weapon per period (weekly by default)."""
+        parts = []
+        for df in self._batches(['time', 'weapon']):
+            parts.append(df.groupby([pd.Grouper(key='time', freq=freq), 'weapon']).size())
+        if not parts:
+            return pd.DataFrame()
+        counts = pd.concat(parts).groupby(level=[0, 1]).sum()
+        return counts.unstack(fill_value=0)
+
+    def distance_distribution(self, bins=DISTANCE_BINS):
+        totals = np.zeros(len(bins) - 1, dtype='int64')
+        for df in self._batches(['distance']):
+            totals += np.histogram(df['distance'].to_numpy(), bins=bins)[0]
+        labels = [f"{int(low)}-{high if high == float('inf') else int(high)}" for low, high in zip(bins, bins[1:])]
+        return pd.Series(totals, index=labels, name='kills')
+
+    def map_headshot_rates(self):
+        totals = None
+        for df in self._batches(['map_name', 'headshot']):
+            part = df.groupby('map_name')['headshot'].agg(['sum', 'count'])
+            totals = part if totals is None else totals.add(part, fill_value=0)
+        if totals is None:
+            return pd.DataFrame()
+        totals = totals.rename(columns={'sum': 'headshots', 'count': 'kills'}).astype('int64')
+        totals['headshot_rate'] = totals['headshots'] / totals['kills']
+        return totals.sort_values('headshot_rate', ascending=False)
+
+REPORTS = {
+    'leaderboard': KillAnalytics.leaderboard,
+    'weapons': KillAnalytics.weapon_meta,
+    'distance': KillAnalytics.distance_distribution,
+    'maps': KillAnalytics.map_headshot_rates,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Season analytics over the Parquet kills export")
+    parser.add_argument('report', choices=sorted(REPORTS))
+    parser.add_argument('--export-dir', default=EXPORT_DIR or 'export')
+    args = parser.parse_args()
+    print(REPORTS[args.report](KillAnalytics(args.export_dir)).to_string())
+
+if __name__ == "__main__":
+    main()
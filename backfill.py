@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import logging
+import mmap
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from config import DB_FILE, DEFAULT_SERVER_ID
+from log_parser import LogParser, parse_timestamp
+from log_reader import LogReader
+from database_manager import DatabaseManager
+from session_tracker import SessionTracker
+
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_CHUNK_SIZE = 32 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 50000
+
+def chunk_ranges(path, chunk_size):
+    """Split a file into (start, end) byte ranges that each end on a newline.
+
+    A trailing line without a newline is left out, as LogReader would leave
+    it, so the checkpoint saved after the load resumes right before it.
+    """
+    if os.path.getsize(path) == 0:
+        return []
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = mm.rfind(b'\n') + 1
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = mm.find(b'\n', end)
+                end = size if newline < 0 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def parse_chunk(task):
+    """Parse one byte range of a log file; runs in a worker process."""
+    path, start, end = task
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = mm[start:end].decode('utf-8', errors='replace').splitlines()
+    # Nothing downstream needs the raw line, so don't pickle it back to the parent
+    return len(lines), [event._replace(line=None) for event in LogParser.parse_lines(lines)]
+
+def parse_file(executor, path, chunk_size, window, counters, read_up_to):
+    """Yield the events of one file in log order, parsing its chunks in parallel.
+
+    At most window chunks are submitted ahead of the one being consumed, so
+    parsed events don't pile up in the parent faster than SQLite takes them.
+    The byte offset the file is read up to is stored in read_up_to[path].
+    """
+    ranges = chunk_ranges(path, chunk_size)
+    read_up_to[path] = ranges[-1][1] if ranges else 0
+    tasks = iter([(path, start, end) for start, end in ranges])
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(parse_chunk, task))
+        if len(pending) == window:
+            break
+    while pending:
+        line_count, events = pending.popleft().result()
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(executor.submit(parse_chunk, task))
+        counters['lines'] += line_count
+        yield from events
+
+def first_timestamp(path):
+    """Time of the first timestamped line in path; files without one sort last."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith('L '):
+                try:
+                    return parse_timestamp(line[2:23])
+                except ValueError:
+                    continue
+    return datetime.max
+
+def has_events(db_file):
+    if not os.path.exists(db_file):
+        return False
+    conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+    try:
+        return any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone()
+                   for table in ('kills', 'map_changes', 'checkpoints'))
+    except sqlite3.OperationalError:
+        # No schema yet
+        return False
+    finally:
+        conn.close()
+
+def end_checkpoint(path, offset):
+    """LogReader checkpoint for a file that has been read up to offset."""
+    with open(path, 'rb') as f:
+        return {
+            'inode': os.fstat(f.fileno()).st_ino,
+            # The size read up to, not the current one, so a log that grew meanwhile still counts as new input
+            'size': offset,
+            'offset': offset,
+            'fingerprint': LogReader.compute_fingerprint(f, offset),
+            'line_hash': LogReader.compute_line_hash(f, offset)
+        }
+
+def remove_database(db_file):
+    for path in (db_file, f'{db_file}-wal', f'{db_file}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def backfill(paths, db_file, workers, chunk_size, batch_size, server_id=DEFAULT_SERVER_ID):
+    """Load the rotated logs in paths into a new database at db_file.
+
+    The files are loaded one after another in order of their first
+    timestamp, since rotated logs don't overlap; only one file's chunks are
+    ever in flight, however many files are given. The newest file is taken
+    to be the live log.
+
+    The database is built next to db_file and moved into place only once it
+    is complete, so a crashed or interrupted backfill can simply be rerun.
+    A database that already holds events is never touched. The checkpoint
+    for the last file is saved with the events, so the next regular run
+    continues the live log from where the backfill stopped.
+    """
+    if has_events(db_file):
+        raise FileExistsError(f"{db_file} already holds events; backfill into a new database")
+    paths = sorted(paths, key=first_timestamp)
+    build_file = f'{db_file}.backfill'
+    remove_database(build_file)
+    db_manager = DatabaseManager(build_file)
+    # Nothing reads the build file until it is moved into place, so skip fsyncs until then
+    db_manager.cursor.execute('PRAGMA synchronous=OFF')
+    sessions = SessionTracker(db_manager, server_id=server_id)
+    counters = {'lines': 0, 'events': 0}
+    read_up_to = {}
+    last_event_time = datetime.min
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # The generators are lazy, so each file is only parsed once the one before it has been loaded
+        merged = itertools.chain.from_iterable(
+            parse_file(executor, path, chunk_size, workers * 2, counters, read_up_to) for path in paths)
+        while True:
+            with db_manager.batch():
+                loaded = 0
+                for event in merged:
+                    db_manager.record_event(event, server_id)
+                    sessions.add(event)
+                    last_event_time = max(last_event_time, event.time)
+                    loaded += 1
+                    if loaded == batch_size:
+                        break
+                sessions.save()
+                if loaded < batch_size:
+                    live_log = paths[-1]
+                    db_manager.save_checkpoint(server_id, end_checkpoint(live_log, read_up_to[live_log]),
+                                               last_event_time)
+            counters['events'] += loaded
+            if loaded < batch_size:
+                break
+            logging.info(f"Loaded {counters['events']} events")
+
+    db_manager.close()
+    with open(build_file, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(build_file, db_file)
+    elapsed = time.perf_counter() - started
+    rate = counters['lines'] / elapsed if elapsed else 0
+    logging.info(f"Backfilled {counters['events']} events from {counters['lines']} lines "
+                 f"in {elapsed:.1f}s ({rate:,.0f} lines/s)")
+    return counters
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the events database from archived logs without sending notifications or summaries")
+    parser.add_argument('logs', nargs='+', help="log files to load, in any order; the newest one is the live log")
+    parser.add_argument('--db', default=DB_FILE, help="database file to create (default: DB_FILE)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="parser processes")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="bytes per parse task")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="events per transaction")
+    parser.add_argument('--server-id', default=DEFAULT_SERVER_ID, help="server the logs came from")
+    args = parser.parse_args()
+    try:
+        backfill(args.logs, args.db, args.workers, args.chunk_size, args.batch_size, args.server_id)
+    except FileExistsError as e:
+        parser.exit(1, f"{e}\n")
+
+if __name__ == "__main__":
+    main()
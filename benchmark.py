@@ -0,0 +1,171 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from log_generator import LogGenerator
+from log_parser import LogParser
+from database_manager import DatabaseManager
+from discord_notifier import DiscordNotifier
+from outbox import Outbox, OutboxDispatcher
+from session_tracker import SessionTracker
+from pipeline import (Pipeline, Ingester, Sink, DatabaseSink, SessionSink, DiscordEventSink, SummarySink,
+                      scoreboard_sender)
+
+BATCH_SIZE = 5000
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    """Accepts webhook posts the way Discord does, without going anywhere."""
+    requests_received = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        StubWebhookHandler.requests_received += 1
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeAI:
+    """Stands in for OpenAIHandler; records prompt sizes instead of calling the API."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def generate_summary(self, previous_summary, new_events):
+        self.calls += 1
+        self.prompt_chars += len(previous_summary) + len(new_events)
+        return f"Summary of {len(new_events)} characters of events"
+
+def percentiles(samples_ns):
+    if not samples_ns:
+        return {}
+    samples = sorted(samples_ns)
+    def pick(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))] / 1000
+    return {'p50_us': pick(50), 'p90_us': pick(90), 'p99_us': pick(99), 'max_us': samples[-1] / 1000}
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_parser(lines):
+    timings = []
+    events = 0
+    started = time.perf_counter()
+    for line in lines:
+        t0 = time.perf_counter_ns()
+        event = LogParser.parse_line(line)
+        timings.append(time.perf_counter_ns() - t0)
+        if event is not None:
+            events += 1
+    elapsed = time.perf_counter() - started
+    return {'lines': len(lines), 'events': events, 'seconds': elapsed,
+            'lines_per_sec': len(lines) / elapsed, 'latency': percentiles(timings)}
+
+def bench_db_writer(events, db_file):
+    db_manager = DatabaseManager(db_file)
+    timings = []
+    started = time.perf_counter()
+    for i in range(0, len(events), BATCH_SIZE):
+        t0 = time.perf_counter_ns()
+        with db_manager.batch():
+            for event in events[i:i + BATCH_SIZE]:
+                db_manager.record_event(event)
+        timings.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    commits = db_manager.commit_count
+    db_manager.close()
+    return {'events': len(events), 'seconds': elapsed, 'events_per_sec': len(events) / elapsed,
+            'commits': commits, 'batch_latency': percentiles(timings)}
+
+class CountingSink(Sink):
+    """Counts the events that reach the sinks."""
+
+    def __init__(self):
+        self.events = 0
+
+    def handle(self, event):
+        self.events += 1
+
+def bench_end_to_end(log_file, db_file, webhook_url):
+    """main.py's cron run plus per-event notifications: Ingester into SQLite, outbox to a stub webhook."""
+    ai = FakeAI()
+    db_manager = DatabaseManager(db_file)
+    dispatcher = OutboxDispatcher(db_file, DiscordNotifier(webhook_url), wake=db_manager.outbox_committed)
+    dispatcher.start()
+    notifier = Outbox(db_manager)
+    counter = CountingSink()
+    sessions = SessionTracker(db_manager, scoreboard_sender(notifier))
+    state_path = os.path.join(os.path.dirname(db_file), 'last_processed.json')
+    pipeline = Pipeline(log_file, db_manager, [DatabaseSink(db_manager), SessionSink(sessions),
+                                               DiscordEventSink(notifier), SummarySink(ai, notifier, db_manager),
+                                               counter], state_path)
+    ingester = Ingester([pipeline])
+    stages = {'ingest': 0.0, 'outbox_drain': 0.0}
+
+    started = time.perf_counter()
+    ingester.run_once()
+    stages['ingest'] = time.perf_counter() - started
+
+    # The dispatcher has been posting alongside ingestion; this waits for the rest
+    t0 = time.perf_counter()
+    dispatcher.close()
+    stages['outbox_drain'] = time.perf_counter() - t0
+
+    elapsed = time.perf_counter() - started
+    ingester.close()
+    commits = db_manager.commit_count
+    outbox_rows = db_manager.conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+    db_manager.close()
+    return {'events': counter.events, 'seconds': elapsed, 'stage_seconds': stages,
+            'commits': commits, 'outbox_rows': outbox_rows, 'webhook_posts': StubWebhookHandler.requests_received,
+            'ai_calls': ai.calls, 'ai_prompt_chars': ai.prompt_chars}
+
+def run(line_count, players, seed):
+    logging.disable(logging.INFO)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'bench.log')
+        LogGenerator(players=players, seed=seed).write(log_file, line_count)
+        with open(log_file, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+        results = {
+            'config': {'lines': line_count, 'players': players, 'seed': seed,
+                       'python': platform.python_version(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'parser': bench_parser(lines),
+        }
+        events = list(LogParser.parse_lines(lines))
+        results['db_writer'] = bench_db_writer(events, os.path.join(tmp, 'writer.db'))
+        results['end_to_end'] = bench_end_to_end(log_file, os.path.join(tmp, 'e2e.db'), webhook_url)
+
+    server.shutdown()
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse -> store -> notify pipeline")
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--players', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    results = run(args.lines, args.players, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
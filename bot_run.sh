@@ -10,6 +10,7 @@ PROJECT_DIR="/home/hl2dmserver/discord_bot"
 cd $PROJECT_DIR
 
 # Run the Python script
+# (to run as a long-lived daemon instead of from cron, use: main.py --follow)
 /usr/bin/python3 $PROJECT_DIR/main.py >> $PROJECT_DIR/cron.log 2>&1
 
 # Deactivate virtual environment if you activated one
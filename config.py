@@ -6,4 +6,32 @@ load_dotenv()
 LOG_FILE = os.getenv('LOG_FILE')
 DB_FILE = os.getenv('DB_FILE')
 DISCORD_WEBHOOK_URL = os.getenv('DISCORD_WEBHOOK_URL')
-LAST_PROCESSED_FILE = 'last_processed.json'
\ No newline at end of file
+DISCORD_MAX_RETRIES = int(os.getenv('DISCORD_MAX_RETRIES', '5'))
+LAST_PROCESSED_FILE = 'last_processed.json'
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+PLAYER_CACHE_SIZE = int(os.getenv('PLAYER_CACHE_SIZE', '4096'))
+SUMMARY_TOKEN_BUDGET = int(os.getenv('SUMMARY_TOKEN_BUDGET', '2000'))
+FOLLOW_POLL_INTERVAL = float(os.getenv('FOLLOW_POLL_INTERVAL', '1.0'))
+EXPORT_DIR = os.getenv('EXPORT_DIR')
+EXPORT_INTERVAL = float(os.getenv('EXPORT_INTERVAL', '3600'))
+EXPORT_MIN_ROWS = int(os.getenv('EXPORT_MIN_ROWS', '10000'))
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+STATS_INTERVAL = float(os.getenv('STATS_INTERVAL', '60'))
+DEBUG_LOG_SAMPLE = int(os.getenv('DEBUG_LOG_SAMPLE', '1000'))
+DEFAULT_SERVER_ID = 'default'
+# Several servers in one process: SERVERS=dm1=/path/to/dm1.log,dm2=/path/to/dm2.log
+SERVERS = [tuple(entry.strip().split('=', 1)) for entry in os.getenv('SERVERS', '').split(',') if entry.strip()] \
+    or [(DEFAULT_SERVER_ID, LOG_FILE)]
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '64'))
+INGEST_BATCH_LINES = int(os.getenv('INGEST_BATCH_LINES', '5000'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '1.0'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_CLAIM_TIMEOUT = int(os.getenv('OUTBOX_CLAIM_TIMEOUT', '300'))
+QUERY_API_PORT = int(os.getenv('QUERY_API_PORT', '8080'))
+QUERY_POOL_SIZE = int(os.getenv('QUERY_POOL_SIZE', '4'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '10'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', '0'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', '3600'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '1000'))
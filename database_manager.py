@@ -1,11 +1,67 @@
 import sqlite3
 import logging
-from config import DB_FILE
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from config import DB_FILE, DB_SYNCHRONOUS, PLAYER_CACHE_SIZE, DEFAULT_SERVER_ID
+import metrics
+
+class PlayerCache:
+    """Bounded LRU mapping between player names and Steam IDs.
+
+    A Steam ID that shows up under a new name drops its old name, so a
+    disconnect under the old name no longer resolves to it.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.by_name = OrderedDict()
+        self.by_steam_id = {}
+
+    def get(self, player_name):
+        steam_id = self.by_name.get(player_name)
+        if steam_id is not None:
+            self.by_name.move_to_end(player_name)
+        return steam_id
+
+    def put(self, player_name, steam_id):
+        old_name = self.by_steam_id.get(steam_id)
+        if old_name is not None and old_name != player_name and self.by_name.get(old_name) == steam_id:
+            del self.by_name[old_name]
+        self.by_name[player_name] = steam_id
+        self.by_name.move_to_end(player_name)
+        self.by_steam_id[steam_id] = player_name
+        while len(self.by_name) > self.max_size:
+            evicted_name, evicted_id = self.by_name.popitem(last=False)
+            if self.by_steam_id.get(evicted_id) == evicted_name:
+                del self.by_steam_id[evicted_id]
 
 class DatabaseManager:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_FILE)
+    def __init__(self, db_file=DB_FILE):
+        self.conn = sqlite3.connect(db_file)
         self.cursor = self.conn.cursor()
+        # Only takes effect on a new file; lets retention hand freed pages back without a full VACUUM
+        self.cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        # WAL lets readers run alongside the writer; NORMAL only fsyncs at checkpoints
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+        self.batch_depth = 0
+        self.commit_count = 0
+        # Wakes an OutboxDispatcher as soon as notifications commit instead of on its next poll
+        self.outbox_committed = threading.Event()
+        self.pending_players = {}
+        self.pending_kills = []
+        self.pending_kill_sessions = []
+        self.pending_map_changes = []
+        self.pending_names = {}
+        self.pending_session_players = {}
+        self.pending_session_ends = []
+        self.pending_checkpoints = {}
+        self.pending_outbox = []
+        self.pending_meta = {}
+        self.player_cache = PlayerCache(PLAYER_CACHE_SIZE)
         self.init_db()
 
     def init_db(self):
@@ -16,26 +72,374 @@ class DatabaseManager:
                                 attacker_health INTEGER, distance REAL, headshot BOOLEAN)''')
         self.cursor.execute('''CREATE TABLE IF NOT EXISTS map_changes
                                (timestamp TEXT, map_name TEXT)''')
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_names'")
+        seed_names = self.cursor.fetchone() is None
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS player_names
+                               (steam_id TEXT, player_name TEXT, first_seen TEXT, last_seen TEXT,
+                                PRIMARY KEY (steam_id, player_name))''')
+        if seed_names:
+            self.cursor.execute('''INSERT OR IGNORE INTO player_names
+                                   SELECT steam_id, player_name, last_seen, last_seen FROM players''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_players_name ON players (player_name)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_kills_attacker ON kills (attacker_steam_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_kills_victim ON kills (victim_steam_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_kills_timestamp ON kills (timestamp)')
+
+        # Aggregates kept up to date in the same transaction as each kill batch
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_stats'")
+        seed_stats = self.cursor.fetchone() is None
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS player_stats
+                               (steam_id TEXT PRIMARY KEY, kills INTEGER DEFAULT 0, deaths INTEGER DEFAULT 0,
+                                suicides INTEGER DEFAULT 0, headshots INTEGER DEFAULT 0,
+                                total_distance REAL DEFAULT 0)''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS weapon_stats
+                               (weapon TEXT PRIMARY KEY, kills INTEGER DEFAULT 0, headshots INTEGER DEFAULT 0,
+                                total_distance REAL DEFAULT 0)''')
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_weapon_stats'")
+        seed_player_weapons = self.cursor.fetchone() is None and not seed_stats
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS player_weapon_stats
+                               (steam_id TEXT, weapon TEXT, kills INTEGER DEFAULT 0, PRIMARY KEY (steam_id, weapon))''')
+        if seed_player_weapons:
+            self._seed_player_weapon_stats()
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS map_sessions
+                               (id INTEGER PRIMARY KEY AUTOINCREMENT, map_name TEXT, started_at TEXT,
+                                kills INTEGER DEFAULT 0, headshots INTEGER DEFAULT 0, total_distance REAL DEFAULT 0)''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_player_stats_kills ON player_stats (kills)')
+        self._add_column('map_sessions', 'ended_at', 'TEXT')
+        # Rows written before multi-server ingestion belong to the default server
+        for table in ('kills', 'map_changes', 'map_sessions'):
+            self._add_column(table, 'server_id', f"TEXT NOT NULL DEFAULT '{DEFAULT_SERVER_ID}'")
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS session_players
+                               (session_id INTEGER, steam_id TEXT, player_name TEXT, kills INTEGER,
+                                deaths INTEGER, headshots INTEGER, seconds_played REAL, present_since TEXT,
+                                PRIMARY KEY (session_id, steam_id))''')
+        # Read positions, undelivered notifications and run state commit with the events they belong to
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS checkpoints
+                               (source TEXT PRIMARY KEY, inode INTEGER, size INTEGER, offset INTEGER,
+                                fingerprint TEXT, line_hash TEXT, last_processed_time TEXT)''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS outbox
+                               (id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT,
+                                created_at TEXT DEFAULT CURRENT_TIMESTAMP, attempts INTEGER DEFAULT 0, sent_at TEXT,
+                                claimed_at TEXT)''')
+        # Set by the dispatcher that is delivering the row, so a second dispatcher skips it
+        self._add_column('outbox', 'claimed_at', 'TEXT')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_unsent ON outbox (id) WHERE sent_at IS NULL')
+        self.cursor.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        if seed_stats:
+            self.rebuild_stats()
         self.conn.commit()
 
+        self._load_current_sessions()
+
+    def _add_column(self, table, column, definition):
+        self.cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [info[1] for info in self.cursor.fetchall()]:
+            self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def _load_current_sessions(self):
+        # Latest map session per server; kills are attributed to it until the next map change
+        self.cursor.execute('SELECT server_id, MAX(id) FROM map_sessions GROUP BY server_id')
+        self.current_sessions = dict(self.cursor.fetchall())
+
+    def rebuild_stats(self):
+        """Recompute player and weapon aggregates from the raw kills table."""
+        logging.info("Rebuilding player and weapon stats from kills")
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'kills_archived_before'")
+        archived = self.cursor.fetchone()
+        if archived is not None:
+            logging.warning(f"Kills before {archived[0]} were archived; the rebuilt stats leave them out")
+        self.cursor.execute('DELETE FROM player_stats')
+        self.cursor.execute('DELETE FROM weapon_stats')
+        self.cursor.execute('''INSERT INTO player_stats (steam_id, kills, headshots, total_distance)
+                               SELECT attacker_steam_id, COUNT(*), SUM(headshot), SUM(distance) FROM kills
+                               WHERE attacker_steam_id != victim_steam_id GROUP BY attacker_steam_id''')
+        self.cursor.execute('''INSERT INTO player_stats (steam_id, deaths, suicides)
+                               SELECT victim_steam_id, COUNT(*), SUM(attacker_steam_id = victim_steam_id) FROM kills
+                               GROUP BY victim_steam_id
+                               ON CONFLICT (steam_id) DO UPDATE SET deaths = excluded.deaths,
+                                                                    suicides = excluded.suicides''')
+        self.cursor.execute('''INSERT INTO weapon_stats (weapon, kills, headshots, total_distance)
+                               SELECT weapon, COUNT(*), SUM(headshot), SUM(distance) FROM kills
+                               WHERE attacker_steam_id != victim_steam_id GROUP BY weapon''')
+        self.cursor.execute('DELETE FROM player_weapon_stats')
+        self._seed_player_weapon_stats()
+
+    def _seed_player_weapon_stats(self):
+        self.cursor.execute('''INSERT INTO player_weapon_stats (steam_id, weapon, kills)
+                               SELECT attacker_steam_id, weapon, COUNT(*) FROM kills
+                               WHERE attacker_steam_id != victim_steam_id GROUP BY attacker_steam_id, weapon''')
+
+    @contextmanager
+    def batch(self):
+        """Buffer writes and commit them in a single transaction when the block exits.
+
+        Repeated upserts of the same player inside the batch collapse to the
+        last one. Batches may be nested; only the outermost one flushes.
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.batch_depth -= 1
+            if self.batch_depth == 0:
+                self.rollback()
+            raise
+        self.batch_depth -= 1
+        if self.batch_depth == 0:
+            self.flush()
+
+    def flush(self):
+        if not (self.pending_players or self.pending_kills or self.pending_map_changes or self.pending_names
+                or self.pending_session_players or self.pending_session_ends or self.pending_checkpoints
+                or self.pending_outbox or self.pending_meta):
+            return
+        started = time.perf_counter()
+        with self.conn:
+            self.cursor.executemany('''INSERT INTO kills (timestamp, attacker_steam_id, victim_steam_id, weapon,
+                                                          attacker_health, distance, headshot, server_id)
+                                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', self.pending_kills)
+            self.cursor.executemany('''INSERT INTO map_changes (timestamp, map_name, server_id) VALUES (?, ?, ?)''',
+                                    self.pending_map_changes)
+            self.cursor.executemany('''INSERT OR REPLACE INTO players (steam_id, player_name, last_seen)
+                                       VALUES (?, ?, ?)''',
+                                    [(steam_id, name, last_seen)
+                                     for steam_id, (name, last_seen) in self.pending_players.items()])
+            self._update_stats()
+            self.cursor.executemany('''INSERT INTO player_names (steam_id, player_name, first_seen, last_seen)
+                                       VALUES (?, ?, ?, ?)
+                                       ON CONFLICT (steam_id, player_name) DO UPDATE SET last_seen = excluded.last_seen''',
+                                    [(steam_id, name, first_seen, last_seen)
+                                     for (steam_id, name), (first_seen, last_seen) in self.pending_names.items()])
+            self.cursor.executemany('INSERT INTO outbox (content) VALUES (?)',
+                                    [(content,) for content in self.pending_outbox])
+            self.cursor.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                    self.pending_meta.items())
+            self.cursor.executemany('''INSERT OR REPLACE INTO checkpoints
+                                       (source, inode, size, offset, fingerprint, line_hash, last_processed_time)
+                                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                    [(source, checkpoint['inode'], checkpoint['size'], checkpoint['offset'],
+                                      checkpoint['fingerprint'], checkpoint.get('line_hash'), last_processed_time)
+                                     for source, (checkpoint, last_processed_time)
+                                     in self.pending_checkpoints.items()])
+            # Readers compare this counter to drop cached query results once new data lands
+            self.cursor.execute('''INSERT INTO meta (key, value) VALUES ('ingest_batch', 1)
+                                   ON CONFLICT (key) DO UPDATE SET value = value + 1''')
+        self.commit_count += 1
+        if self.pending_outbox:
+            self.outbox_committed.set()
+        metrics.db_flush_seconds.observe(time.perf_counter() - started)
+        logging.info(f"Committed batch: {len(self.pending_kills)} kills, "
+                     f"{len(self.pending_map_changes)} map changes, {len(self.pending_players)} players, "
+                     f"{len(self.pending_outbox)} notifications")
+        self.discard_pending()
+
+    def _update_stats(self):
+        players = {}
+        weapons = {}
+        player_weapons = {}
+        sessions = {}
+        for (_, attacker, victim, weapon, _, distance, headshot, _), session_id in \
+                zip(self.pending_kills, self.pending_kill_sessions):
+            victim_stats = players.setdefault(victim, [0, 0, 0, 0, 0.0])
+            victim_stats[1] += 1
+            if attacker == victim:
+                victim_stats[2] += 1
+                continue
+            attacker_stats = players.setdefault(attacker, [0, 0, 0, 0, 0.0])
+            attacker_stats[0] += 1
+            attacker_stats[3] += bool(headshot)
+            attacker_stats[4] += distance
+            weapon_stats = weapons.setdefault(weapon, [0, 0, 0.0])
+            weapon_stats[0] += 1
+            weapon_stats[1] += bool(headshot)
+            weapon_stats[2] += distance
+            player_weapons[attacker, weapon] = player_weapons.get((attacker, weapon), 0) + 1
+            if session_id is not None:
+                session_stats = sessions.setdefault(session_id, [0, 0, 0.0])
+                session_stats[0] += 1
+                session_stats[1] += bool(headshot)
+                session_stats[2] += distance
+
+        self.cursor.executemany('''INSERT INTO player_stats (steam_id, kills, deaths, suicides, headshots, total_distance)
+                                   VALUES (?, ?, ?, ?, ?, ?)
+                                   ON CONFLICT (steam_id) DO UPDATE SET
+                                       kills = kills + excluded.kills, deaths = deaths + excluded.deaths,
+                                       suicides = suicides + excluded.suicides,
+                                       headshots = headshots + excluded.headshots,
+                                       total_distance = total_distance + excluded.total_distance''',
+                                [(steam_id, *stats) for steam_id, stats in players.items()])
+        self.cursor.executemany('''INSERT INTO weapon_stats (weapon, kills, headshots, total_distance)
+                                   VALUES (?, ?, ?, ?)
+                                   ON CONFLICT (weapon) DO UPDATE SET
+                                       kills = kills + excluded.kills,
+                                       headshots = headshots + excluded.headshots,
+                                       total_distance = total_distance + excluded.total_distance''',
+                                [(weapon, *stats) for weapon, stats in weapons.items()])
+        self.cursor.executemany('''INSERT INTO player_weapon_stats (steam_id, weapon, kills) VALUES (?, ?, ?)
+                                   ON CONFLICT (steam_id, weapon) DO UPDATE SET kills = kills + excluded.kills''',
+                                [(steam_id, weapon, kills) for (steam_id, weapon), kills in player_weapons.items()])
+
+        self.cursor.executemany('''UPDATE map_sessions SET kills = kills + ?, headshots = headshots + ?,
+                                   total_distance = total_distance + ? WHERE id = ?''',
+                                [(*stats, session_id) for session_id, stats in sessions.items()])
+
+        self.cursor.executemany('''INSERT OR REPLACE INTO session_players
+                                   (session_id, steam_id, player_name, kills, deaths, headshots,
+                                    seconds_played, present_since)
+                                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                                [(session_id, steam_id, *row)
+                                 for (session_id, steam_id), row in self.pending_session_players.items()])
+        self.cursor.executemany('UPDATE map_sessions SET ended_at = ? WHERE id = ?', self.pending_session_ends)
+
+    def discard_pending(self):
+        self.pending_players = {}
+        self.pending_kills = []
+        self.pending_kill_sessions = []
+        self.pending_map_changes = []
+        self.pending_names = {}
+        self.pending_session_players = {}
+        self.pending_session_ends = []
+        self.pending_checkpoints = {}
+        self.pending_outbox = []
+        self.pending_meta = {}
+
+    def rollback(self):
+        """Drop everything written since the last flush, including map sessions opened in the batch."""
+        self.conn.rollback()
+        self.discard_pending()
+        self._load_current_sessions()
+
     def update_player(self, steam_id, player_name, timestamp):
-        self.cursor.execute('''INSERT OR REPLACE INTO players (steam_id, player_name, last_seen)
-                               VALUES (?, ?, ?)''', (steam_id, player_name, timestamp))
-        self.conn.commit()
+        # Re-insert so the batch stays ordered by most recent sighting
+        self.pending_players.pop(steam_id, None)
+        self.pending_players[steam_id] = (player_name, timestamp)
+        first_seen = self.pending_names.get((steam_id, player_name), (timestamp,))[0]
+        self.pending_names[(steam_id, player_name)] = (first_seen, timestamp)
+        self.player_cache.put(player_name, steam_id)
+        if not self.batch_depth:
+            self.flush()
 
-    def record_kill(self, timestamp, attacker_steam_id, victim_steam_id, weapon, attacker_health, distance, headshot):
-        self.cursor.execute('''INSERT INTO kills VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                            (timestamp, attacker_steam_id, victim_steam_id, weapon, attacker_health, distance, headshot))
-        self.conn.commit()
+    def record_kill(self, timestamp, attacker_steam_id, victim_steam_id, weapon, attacker_health, distance, headshot,
+                    server_id=DEFAULT_SERVER_ID):
+        self.pending_kills.append((timestamp, attacker_steam_id, victim_steam_id, weapon,
+                                   attacker_health, distance, headshot, server_id))
+        self.pending_kill_sessions.append(self.current_sessions.get(server_id))
+        if not self.batch_depth:
+            self.flush()
 
-    def record_map_change(self, timestamp, map_name):
-        self.cursor.execute('''INSERT INTO map_changes VALUES (?, ?)''', (timestamp, map_name))
-        self.conn.commit()
+    def record_map_change(self, timestamp, map_name, server_id=DEFAULT_SERVER_ID):
+        self.pending_map_changes.append((timestamp, map_name, server_id))
+        # The session row is inserted now so its id is known to the session tracker; it commits with the batch
+        self.cursor.execute('INSERT INTO map_sessions (map_name, started_at, server_id) VALUES (?, ?, ?)',
+                            (map_name, timestamp, server_id))
+        self.current_sessions[server_id] = self.cursor.lastrowid
+        if not self.batch_depth:
+            self.flush()
+
+    def save_session_players(self, session_id, players):
+        """Queue per-player session rows: (steam_id, name, kills, deaths, headshots, seconds_played, present_since)."""
+        for steam_id, *row in players:
+            self.pending_session_players[(session_id, steam_id)] = tuple(row)
+        if not self.batch_depth:
+            self.flush()
+
+    def end_map_session(self, session_id, ended_at):
+        self.pending_session_ends.append((ended_at, session_id))
+        if not self.batch_depth:
+            self.flush()
+
+    def save_checkpoint(self, source, checkpoint, last_processed_time):
+        """Queue a LogReader checkpoint for source; it commits with the events read up to it."""
+        self.pending_checkpoints[source] = (checkpoint, last_processed_time.isoformat())
+        if not self.batch_depth:
+            self.flush()
+
+    def get_checkpoint(self, source):
+        """Return (checkpoint, last_processed_time) for source, or None if it has never been read."""
+        self.cursor.execute('''SELECT inode, size, offset, fingerprint, line_hash, last_processed_time
+                               FROM checkpoints WHERE source = ?''', (source,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        inode, size, offset, fingerprint, line_hash, last_processed_time = row
+        checkpoint = {'inode': inode, 'size': size, 'offset': offset,
+                      'fingerprint': fingerprint, 'line_hash': line_hash}
+        return checkpoint, datetime.fromisoformat(last_processed_time)
+
+    def queue_notification(self, content):
+        """Add a message to the outbox; OutboxDispatcher delivers it once the batch commits."""
+        self.pending_outbox.append(content)
+        if not self.batch_depth:
+            self.flush()
+
+    def set_meta(self, key, value):
+        self.pending_meta[key] = value
+        if not self.batch_depth:
+            self.flush()
+
+    def get_meta(self, key, default=None):
+        if key in self.pending_meta:
+            return self.pending_meta[key]
+        self.cursor.execute('SELECT value FROM meta WHERE key = ?', (key,))
+        row = self.cursor.fetchone()
+        return default if row is None else row[0]
+
+    def get_map_session(self, session_id):
+        self.cursor.execute('SELECT map_name, started_at, ended_at FROM map_sessions WHERE id = ?', (session_id,))
+        return self.cursor.fetchone()
+
+    def get_session_players(self, session_id):
+        self.cursor.execute('''SELECT steam_id, player_name, kills, deaths, headshots, seconds_played, present_since
+                               FROM session_players WHERE session_id = ?''', (session_id,))
+        return self.cursor.fetchall()
+
+    def record_event(self, event, server_id=DEFAULT_SERVER_ID):
+        """Store a parsed LogParser event from the given server."""
+        timestamp = event.timestamp
+        if event.type == 'connect':
+            self.update_player(event.steam_id, event.player_name, timestamp)
+        elif event.type == 'disconnect':
+            steam_id = self.get_player_steam_id(event.player_name)
+            if steam_id:
+                self.update_player(steam_id, event.player_name, timestamp)
+        elif event.type == 'kill':
+            self.record_kill(timestamp, event.attacker_steam_id, event.victim_steam_id,
+                             event.weapon, event.attacker_health, event.distance, event.headshot, server_id)
+            self.update_player(event.attacker_steam_id, event.attacker_name, timestamp)
+            self.update_player(event.victim_steam_id, event.victim_name, timestamp)
+        elif event.type == 'map_change':
+            self.record_map_change(timestamp, event.map_name, server_id)
 
     def get_player_steam_id(self, player_name):
+        steam_id = self.player_cache.get(player_name)
+        if steam_id is not None:
+            return steam_id
+        for steam_id, (name, _) in reversed(self.pending_players.items()):
+            if name == player_name:
+                self.player_cache.put(player_name, steam_id)
+                return steam_id
         self.cursor.execute("SELECT steam_id FROM players WHERE player_name = ?", (player_name,))
         result = self.cursor.fetchone()
-        return result[0] if result else None
+        if result is None:
+            return None
+        self.player_cache.put(player_name, result[0])
+        return result[0]
+
+    def get_player_stats(self, steam_id):
+        self.cursor.execute('''SELECT kills, deaths, suicides, headshots, total_distance
+                               FROM player_stats WHERE steam_id = ?''', (steam_id,))
+        return self.cursor.fetchone()
+
+    def get_leaderboard(self, limit=10):
+        self.cursor.execute('''SELECT s.steam_id, p.player_name, s.kills, s.deaths, s.headshots
+                               FROM player_stats s LEFT JOIN players p ON p.steam_id = s.steam_id
+                               ORDER BY s.kills DESC LIMIT ?''', (limit,))
+        return self.cursor.fetchall()
+
+    def get_weapon_stats(self):
+        self.cursor.execute('SELECT weapon, kills, headshots, total_distance FROM weapon_stats ORDER BY kills DESC')
+        return self.cursor.fetchall()
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        self.flush()
+        self.conn.close()
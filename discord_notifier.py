@@ -1,16 +1,114 @@
-import requests
+import time
 import logging
-from config import DISCORD_WEBHOOK_URL
+from urllib.parse import urlparse
+from config import DISCORD_WEBHOOK_URL, DISCORD_MAX_RETRIES
+import metrics
+
+MAX_MESSAGE_LENGTH = 2000
 
 class DiscordNotifier:
+    """Posts messages to a Discord webhook over one pooled HTTP session.
+
+    Pacing follows Discord's rate-limit headers, 429 responses wait for
+    retry_after, and connection errors, timeouts and 5xx responses are
+    retried with bounded backoff. A missing or malformed webhook URL and
+    other 4xx responses fail at once, since retrying cannot fix them.
+    Queueing and coalescing live in the outbox; see OutboxDispatcher.
+    """
+
+    def __init__(self, webhook_url=DISCORD_WEBHOOK_URL, max_retries=DISCORD_MAX_RETRIES):
+        self.webhook_url = webhook_url
+        self.max_retries = max_retries
+        self._session = None
+        self.remaining = None
+        self.reset_at = 0.0
+
+    @property
+    def session(self):
+        # requests is only imported once there is something to deliver
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
     @staticmethod
-    def send_notification(content):
+    def valid_webhook_url(url):
+        parsed = urlparse(url or '')
+        return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
+
+    @staticmethod
+    def split_message(content):
+        if len(content) <= MAX_MESSAGE_LENGTH:
+            return [content]
+        chunks = []
+        while len(content) > MAX_MESSAGE_LENGTH:
+            cut = content.rfind('\n', 0, MAX_MESSAGE_LENGTH)
+            if cut <= 0:
+                cut = MAX_MESSAGE_LENGTH
+            chunks.append(content[:cut])
+            content = content[cut:].lstrip('\n')
+        if content:
+            chunks.append(content)
+        return chunks
+
+    def _wait_for_rate_limit(self):
+        if self.remaining == 0:
+            delay = self.reset_at - time.monotonic()
+            if delay > 0:
+                logging.info(f"Discord rate limit reached, waiting {delay:.2f}s")
+                time.sleep(delay)
+
+    def _update_rate_limit(self, response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset_after = response.headers.get('X-RateLimit-Reset-After')
+        if remaining is not None and reset_after is not None:
+            self.remaining = int(remaining)
+            self.reset_at = time.monotonic() + float(reset_after)
+
+    def deliver(self, content):
+        """Post content to the webhook, returning True once Discord accepts it."""
         logging.info(f"Attempting to send Discord notification: {content}")
-        try:
-            response = requests.post(DISCORD_WEBHOOK_URL, json={"content": content})
-            if response.status_code == 204:
-                logging.info("Discord notification sent successfully")
+        if not self.valid_webhook_url(self.webhook_url):
+            metrics.discord_messages.inc(result='error')
+            logging.error(f"Not sending Discord notification: webhook URL {self.webhook_url!r} is missing or invalid")
+            return False
+        from requests import ConnectionError, RequestException, Timeout
+        backoff = 1.0
+        for attempt in range(1, self.max_retries + 1):
+            self._wait_for_rate_limit()
+            try:
+                with metrics.discord_seconds.time():
+                    response = self.session.post(self.webhook_url, json={"content": content}, timeout=10)
+            except (ConnectionError, Timeout) as e:
+                metrics.discord_messages.inc(result='error')
+                logging.error(f"Error sending Discord notification (attempt {attempt}): {str(e)}")
+            except RequestException as e:
+                metrics.discord_messages.inc(result='error')
+                logging.error(f"Failed to send Discord notification: {str(e)}")
+                return False
             else:
-                logging.error(f"Failed to send Discord notification. Status code: {response.status_code}")
-        except requests.RequestException as e:
-            logging.error(f"Error sending Discord notification: {str(e)}")
\ No newline at end of file
+                metrics.discord_messages.inc(result=str(response.status_code))
+                self._update_rate_limit(response)
+                if 200 <= response.status_code < 300:
+                    logging.info("Discord notification sent successfully")
+                    return True
+                if response.status_code == 429:
+                    try:
+                        retry_after = float(response.json().get('retry_after', backoff))
+                    except ValueError:
+                        retry_after = float(response.headers.get('Retry-After', backoff))
+                    logging.warning(f"Discord rate limited the webhook, retrying in {retry_after:.2f}s")
+                    time.sleep(retry_after)
+                    continue
+                if response.status_code < 500:
+                    logging.error(f"Failed to send Discord notification. Status code: {response.status_code}")
+                    return False
+                logging.error(f"Discord returned {response.status_code} (attempt {attempt})")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+        logging.error(f"Giving up on Discord notification after {self.max_retries} attempts")
+        return False
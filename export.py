@@ -0,0 +1,175 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import time
+from config import DB_FILE, EXPORT_DIR
+from log_parser import parse_db_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_STATE_FILE = 'export_state.json'
+CHUNK_ROWS = 200000
+
+class ParquetExporter:
+    """Appends new rows from the SQLite tables to partitioned Parquet files.
+
+    kills are partitioned by date and map, map_changes by date; players is a
+    small upserted table and is rewritten as a single file each time. The
+    last exported rowid of each append-only table is kept in
+    export_state.json so every run only exports what is new.
+
+    Every export adds a file to each partition it touches, so callers that
+    export often pass min_rows and max_age: an export is then skipped until
+    min_rows new rows have built up or the last one is max_age seconds old.
+    """
+
+    def __init__(self, db_file=DB_FILE, export_dir=EXPORT_DIR):
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self.db_file = db_file
+        self.export_dir = export_dir
+        self.state_path = os.path.join(export_dir, EXPORT_STATE_FILE)
+        os.makedirs(export_dir, exist_ok=True)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _map_timelines(self, conn):
+        """Map change times and names per server, sorted by time."""
+        changes = {}
+        for timestamp, map_name, server_id in conn.execute(
+                'SELECT timestamp, map_name, server_id FROM map_changes ORDER BY rowid'):
+            time = parse_db_timestamp(timestamp)
+            if time is not None:
+                changes.setdefault(server_id, []).append((time, map_name))
+        timelines = {}
+        for server_id, server_changes in changes.items():
+            server_changes.sort(key=lambda change: change[0])
+            timelines[server_id] = ([time for time, _ in server_changes], [name for _, name in server_changes])
+        return timelines
+
+    def _export_kills(self, conn, last_rowid):
+        timelines = self._map_timelines(conn)
+        exported = 0
+        while True:
+            rows = conn.execute('''SELECT rowid, timestamp, attacker_steam_id, victim_steam_id, weapon,
+                                          attacker_health, distance, headshot, server_id
+                                   FROM kills WHERE rowid > ? ORDER BY rowid LIMIT ?''',
+                                (last_rowid, CHUNK_ROWS)).fetchall()
+            if not rows:
+                return last_rowid, exported
+
+            columns = {name: [] for name in ('time', 'attacker_steam_id', 'victim_steam_id', 'weapon',
+                                             'attacker_health', 'distance', 'headshot', 'server_id',
+                                             'date', 'map_name')}
+            for _, timestamp, attacker, victim, weapon, health, distance, headshot, server_id in rows:
+                time = parse_db_timestamp(timestamp)
+                times, maps = timelines.get(server_id, ([], []))
+                # The map is whichever change most recently preceded the kill
+                index = bisect.bisect_right(times, time) - 1 if time is not None else -1
+                columns['time'].append(time)
+                columns['attacker_steam_id'].append(attacker)
+                columns['victim_steam_id'].append(victim)
+                columns['weapon'].append(weapon)
+                columns['attacker_health'].append(health)
+                columns['distance'].append(distance)
+                columns['headshot'].append(bool(headshot))
+                columns['server_id'].append(server_id)
+                columns['date'].append(time.strftime('%Y-%m-%d') if time else 'unknown')
+                columns['map_name'].append(maps[index] if index >= 0 else 'unknown')
+
+            first_rowid = rows[0][0]
+            pq.write_to_dataset(pa.table(columns), os.path.join(self.export_dir, 'kills'),
+                                partition_cols=['date', 'map_name'],
+                                basename_template=f'part-{first_rowid}-{{i}}.parquet')
+            last_rowid = rows[-1][0]
+            exported += len(rows)
+
+    def _export_map_changes(self, conn, last_rowid):
+        rows = conn.execute('''SELECT rowid, timestamp, map_name, server_id FROM map_changes
+                               WHERE rowid > ? ORDER BY rowid''', (last_rowid,)).fetchall()
+        if not rows:
+            return last_rowid, 0
+        times = [parse_db_timestamp(row[1]) for row in rows]
+        table = pa.table({
+            'time': times,
+            'map_name': [row[2] for row in rows],
+            'server_id': [row[3] for row in rows],
+            'date': [time.strftime('%Y-%m-%d') if time else 'unknown' for time in times],
+        })
+        pq.write_to_dataset(table, os.path.join(self.export_dir, 'map_changes'), partition_cols=['date'],
+                            basename_template=f'part-{rows[0][0]}-{{i}}.parquet')
+        return rows[-1][0], len(rows)
+
+    def _export_players(self, conn):
+        rows = conn.execute('SELECT steam_id, player_name, last_seen FROM players').fetchall()
+        table = pa.table({
+            'steam_id': [row[0] for row in rows],
+            'player_name': [row[1] for row in rows],
+            'last_seen': [parse_db_timestamp(row[2]) for row in rows],
+        })
+        players_dir = os.path.join(self.export_dir, 'players')
+        os.makedirs(players_dir, exist_ok=True)
+        tmp_path = os.path.join(players_dir, 'players.parquet.tmp')
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(players_dir, 'players.parquet'))
+        return len(rows)
+
+    def _due(self, conn, state, min_rows, max_age):
+        new_rows = sum(conn.execute(f'SELECT COUNT(*) FROM {table} WHERE rowid > ?',
+                                    (state.get(table, 0),)).fetchone()[0]
+                       for table in ('kills', 'map_changes'))
+        if not new_rows:
+            return False
+        if new_rows >= min_rows:
+            return True
+        try:
+            age = time.time() - os.path.getmtime(self.state_path)
+        except FileNotFoundError:
+            return True
+        return max_age is not None and age >= max_age
+
+    def export(self, min_rows=0, max_age=None):
+        """Export what is new; returns False if the export was skipped."""
+        state = self._load_state()
+        conn = sqlite3.connect(f'file:{self.db_file}?mode=ro', uri=True)
+        try:
+            if min_rows and not self._due(conn, state, min_rows, max_age):
+                logging.debug(f"Fewer than {min_rows} new rows, leaving them for a later export")
+                return False
+            state['kills'], kills = self._export_kills(conn, state.get('kills', 0))
+            state['map_changes'], map_changes = self._export_map_changes(conn, state.get('map_changes', 0))
+            players = self._export_players(conn)
+        finally:
+            conn.close()
+        self._save_state(state)
+        logging.info(f"Exported {kills} kills, {map_changes} map changes and {players} players to {self.export_dir}")
+        return True
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Append new events to the Parquet export")
+    parser.add_argument('--db', default=DB_FILE)
+    parser.add_argument('--export-dir', default=EXPORT_DIR or 'export')
+    args = parser.parse_args()
+    ParquetExporter(args.db, args.export_dir).export()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+WEAPONS = ['crowbar', 'crossbow_bolt', 'smg1', 'ar2', 'shotgun', 'grenade_frag', 'rpg_missile',
+           'physics', 'physcannon', '357', 'pistol', 'stunstick']
+MAPS = ['dm_lockdown', 'dm_overwatch', 'dm_steamlab', 'dm_underpass', 'dm_resistance', 'dm_powerhouse']
+# Names that trip up naive parsing: parentheses, separators, keywords and non-ASCII
+EDGE_CASE_NAMES = ['Har (per)', 'a | b', 'x killed y', ') killed (', 'Ünïcødé', 'name (Steam ID: fake)',
+                   'Player connected: me', '   spaced   ']
+NOISE_LINES = [
+    'L {ts}: "Harper<2><STEAM_0:1:1><>" say "gg"',
+    'L {ts}: [SM] Loaded plugin event_logger.smx',
+    'L {ts}: server cvars start',
+    'L {ts}: [event_logger.smx] Debug: round timer tick',
+    'L {ts}: "Bob<3><STEAM_0:0:2><>" entered the game',
+]
+
+class LogGenerator:
+    """Deterministic synthetic [event_logger.smx] log for benchmarks and fixtures.
+
+    The same seed always produces the same log, so runs can be compared.
+    """
+
+    def __init__(self, players=16, kill_rate=0.6, noise_rate=0.3, edge_case_names=True,
+                 lines_per_second=5, seed=0, start=datetime(2026, 1, 1)):
+        self.random = random.Random(seed)
+        self.kill_rate = kill_rate
+        self.noise_rate = noise_rate
+        self.lines_per_second = lines_per_second
+        self.time = start
+        names = [f"Player{i}" for i in range(players)]
+        if edge_case_names:
+            for i, name in enumerate(EDGE_CASE_NAMES[:players]):
+                names[i] = name
+        self.players = [(name, 'BOT' if i % 10 == 9 else f"STEAM_0:{i % 2}:{100000 + i}")
+                        for i, name in enumerate(names)]
+        self.online = []
+
+    def _timestamp(self):
+        if self.random.random() < 1 / self.lines_per_second:
+            self.time += timedelta(seconds=1)
+        return self.time.strftime('%m/%d/%Y - %H:%M:%S')
+
+    def _presence(self, prefix):
+        offline = [p for p in self.players if p not in self.online]
+        roll = self.random.random()
+        if offline and (len(self.online) < 2 or roll < 0.5):
+            name, steam_id = self.random.choice(offline)
+            self.online.append((name, steam_id))
+            return f"{prefix}Player connected: {name} (Steam ID: {steam_id})"
+        if self.online and roll < 0.9:
+            name, _ = self.online.pop(self.random.randrange(len(self.online)))
+            return f"{prefix}Player disconnected: {name}"
+        return f"{prefix}Map changed to: {self.random.choice(MAPS)}"
+
+    def _kill(self, prefix):
+        attacker = self.random.choice(self.online)
+        # Roughly one kill in twenty is a suicide
+        victim = attacker if self.random.random() < 0.05 else self.random.choice(self.online)
+        return (f"{prefix}Kill: {attacker[0]} ({attacker[1]}) killed {victim[0]} ({victim[1]}) | "
+                f"Weapon: {self.random.choice(WEAPONS)} | Attacker Health: {self.random.randint(1, 100)} | "
+                f"Distance: {self.random.uniform(0, 3000):.2f} | "
+                f"Headshot: {'Yes' if self.random.random() < 0.2 else 'No'}")
+
+    def lines(self, count):
+        for _ in range(count):
+            ts = self._timestamp()
+            prefix = f"L {ts}: [event_logger.smx] "
+            roll = self.random.random()
+            if roll < self.noise_rate:
+                yield self.random.choice(NOISE_LINES).format(ts=ts)
+            elif roll < self.noise_rate + self.kill_rate and len(self.online) >= 2:
+                yield self._kill(prefix)
+            else:
+                # Presence churn and map changes make up the rest
+                yield self._presence(prefix)
+
+    def write(self, path, count):
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.lines(count):
+                f.write(line + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic HL2DM event log")
+    parser.add_argument('output', nargs='?', help="file to write (default: stdout)")
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--players', type=int, default=16)
+    parser.add_argument('--kill-rate', type=float, default=0.6)
+    parser.add_argument('--noise-rate', type=float, default=0.3)
+    parser.add_argument('--no-edge-case-names', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = LogGenerator(players=args.players, kill_rate=args.kill_rate, noise_rate=args.noise_rate,
+                             edge_case_names=not args.no_edge_case_names, seed=args.seed)
+    if args.output:
+        generator.write(args.output, args.lines)
+    else:
+        for line in generator.lines(args.lines):
+            sys.stdout.write(line + '\n')
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,196 @@
-import re
+import time
+from collections import Counter
 from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+import metrics
+
+TIMESTAMP_FORMAT = '%m/%d/%Y - %H:%M:%S'
+DIGITS = '0123456789'
+
+class ConnectEvent(NamedTuple):
+    time: datetime
+    player_name: str
+    steam_id: str
+    line: str
+    type = 'connect'
+
+    @property
+    def timestamp(self):
+        return self.time.strftime(TIMESTAMP_FORMAT)
+
+class DisconnectEvent(NamedTuple):
+    time: datetime
+    player_name: str
+    line: str
+    type = 'disconnect'
+
+    @property
+    def timestamp(self):
+        return self.time.strftime(TIMESTAMP_FORMAT)
+
+class KillEvent(NamedTuple):
+    time: datetime
+    attacker_name: str
+    attacker_steam_id: str
+    victim_name: str
+    victim_steam_id: str
+    weapon: str
+    attacker_health: int
+    distance: float
+    headshot: bool
+    line: str
+    type = 'kill'
+
+    @property
+    def timestamp(self):
+        return self.time.strftime(TIMESTAMP_FORMAT)
+
+class MapChangeEvent(NamedTuple):
+    time: datetime
+    map_name: str
+    line: str
+    type = 'map_change'
+
+    @property
+    def timestamp(self):
+        return self.time.strftime(TIMESTAMP_FORMAT)
+
+@lru_cache(maxsize=1024)
+def parse_timestamp(timestamp_str):
+    # Busy servers log many lines per second, so the same string repeats a lot
+    return datetime.strptime(timestamp_str, TIMESTAMP_FORMAT)
+
+def parse_db_timestamp(value):
+    """Parse a timestamp stored in the database; None if it is missing or malformed."""
+    try:
+        return parse_timestamp(value)
+    except (TypeError, ValueError):
+        return None
 
 class LogParser:
-    CONNECT_RE = re.compile(r'\[event_logger\.smx\] Player connected: (.+) \(Steam ID: (.+)\)')
-    DISCONNECT_RE = re.compile(r'\[event_logger\.smx\] Player disconnected: (.+)')
-    KILL_RE = re.compile(r'\[event_logger\.smx\] Kill: (.+) \((.+)\) killed (.+) \((.+)\) \| Weapon: (.+) \| Attacker Health: (\d+) \| Distance: ([\d.]+) \| Headshot: (.+)')
-    MAP_CHANGE_RE = re.compile(r'\[event_logger\.smx\] Map changed to: (.+)')
+    """Parses [event_logger.smx] lines from the HL2DM server log.
+
+    Lines without the plugin tag are rejected with a substring search, and
+    the keyword after the tag selects a split-based decoder, so each line is
+    scanned at most a couple of times and nothing backtracks.
+    """
+    TAG = '[event_logger.smx] '
+    CONNECT_PREFIX = 'Player connected: '
+    DISCONNECT_PREFIX = 'Player disconnected: '
+    KILL_PREFIX = 'Kill: '
+    MAP_CHANGE_PREFIX = 'Map changed to: '
+
+    @staticmethod
+    def _split_steam_id(text):
+        # "Name (STEAM_0:1:23)" -> ("Name", "STEAM_0:1:23"); the name may itself contain parentheses
+        if not text.endswith(')'):
+            return None
+        name, sep, steam_id = text[:-1].rpartition(' (')
+        if not sep or not name or not steam_id or ' ' in steam_id or ')' in steam_id:
+            return None
+        return name, steam_id
+
+    @staticmethod
+    def parse_connect(body, timestamp, line):
+        name, sep, steam_id = body.rpartition(' (Steam ID: ')
+        if not sep or not name or not steam_id.endswith(')') or len(steam_id) < 2:
+            return None
+        return ConnectEvent(timestamp, name, steam_id[:-1], line)
+
+    @staticmethod
+    def parse_disconnect(body, timestamp, line):
+        if not body:
+            return None
+        return DisconnectEvent(timestamp, body, line)
+
+    @staticmethod
+    def parse_kill(body, timestamp, line):
+        # Split the fixed trailing fields off the right so names containing " | " are left intact
+        fields = body.rsplit(' | ', 4)
+        if len(fields) != 5:
+            return None
+        players, weapon, health, distance, headshot = fields
+        if not (weapon.startswith('Weapon: ') and health.startswith('Attacker Health: ')
+                and distance.startswith('Distance: ') and headshot.startswith('Headshot: ')):
+            return None
+
+        # Names may contain ") killed " too; take the rightmost split where both Steam IDs are well formed
+        split_at = len(players)
+        while True:
+            split_at = players.rfind(') killed ', 0, split_at)
+            if split_at < 0:
+                return None
+            attacker = LogParser._split_steam_id(players[:split_at + 1])
+            victim = LogParser._split_steam_id(players[split_at + 9:])
+            if attacker is not None and victim is not None:
+                break
+
+        # Digits only, as KILL_RE's \d+ and [\d.]+ allowed: int() and float() would also take
+        # signs, exponents, "nan" and "inf", and a NaN distance turns the stats totals NULL
+        health, distance = health[17:], distance[10:]
+        if not health or health.strip(DIGITS) or not distance or distance.strip(DIGITS + '.'):
+            return None
+        try:
+            attacker_health = int(health)
+            distance = float(distance)
+        except ValueError:
+            return None
+
+        return KillEvent(timestamp, attacker[0], attacker[1], victim[0], victim[1], weapon[8:],
+                         attacker_health, distance, headshot[10:] == 'Yes', line)
+
+    @staticmethod
+    def parse_map_change(body, timestamp, line):
+        if not body:
+            return None
+        return MapChangeEvent(timestamp, body, line)
 
     @staticmethod
     def parse_line(line):
-        timestamp = datetime.now().strftime('%m/%d/%Y - %H:%M:%S')
-        
-        connect_match = LogParser.CONNECT_RE.search(line)
-        if connect_match:
-            return {'type': 'connect', 'timestamp': timestamp, 'player_name': connect_match.group(1), 'steam_id': connect_match.group(2)}
-
-        disconnect_match = LogParser.DISCONNECT_RE.search(line)
-        if disconnect_match:
-            return {'type': 'disconnect', 'timestamp': timestamp, 'player_name': disconnect_match.group(1)}
-
-        kill_match = LogParser.KILL_RE.search(line)
-        if kill_match:
-            return {
-                'type': 'kill',
-                'timestamp': timestamp,
-                'attacker_name': kill_match.group(1),
-                'attacker_steam_id': kill_match.group(2),
-                'victim_name': kill_match.group(3),
-                'victim_steam_id': kill_match.group(4),
-                'weapon': kill_match.group(5),
-                'attacker_health': int(kill_match.group(6)),
-                'distance': float(kill_match.group(7)),
-                'headshot': kill_match.group(8) == 'Yes'
-            }
-
-        map_change_match = LogParser.MAP_CHANGE_RE.search(line)
-        if map_change_match:
-            return {'type': 'map_change', 'timestamp': timestamp, 'map_name': map_change_match.group(1)}
-
-        return None
\ No newline at end of file
+        tag_index = line.find(LogParser.TAG)
+        if tag_index < 0:
+            return None
+        line = line.rstrip('\r\n')
+        rest = line[tag_index + len(LogParser.TAG):]
+
+        # Lines start with "L mm/dd/yyyy - hh:mm:ss: "
+        if not line.startswith('L '):
+            return None
+        try:
+            timestamp = parse_timestamp(line[2:23])
+        except ValueError:
+            return None
+
+        for prefix, decoder in LogParser.DECODERS:
+            if rest.startswith(prefix):
+                return decoder(rest[len(prefix):], timestamp, line)
+        return None
+
+    @staticmethod
+    def parse_lines(lines):
+        """Yield the parsed event for every line in lines that contains one."""
+        parse_line = LogParser.parse_line
+        perf_counter = time.perf_counter
+        counts = Counter()
+        elapsed = 0.0
+        try:
+            for line in lines:
+                started = perf_counter()
+                event = parse_line(line)
+                elapsed += perf_counter() - started
+                if event is not None:
+                    counts[event.type] += 1
+                    yield event
+        finally:
+            # Recorded once per batch so the hot loop stays lock-free
+            metrics.parse_seconds.observe(elapsed)
+            for event_type, count in counts.items():
+                metrics.events_parsed.inc(count, type=event_type)
+
+LogParser.DECODERS = (
+    (LogParser.KILL_PREFIX, LogParser.parse_kill),
+    (LogParser.CONNECT_PREFIX, LogParser.parse_connect),
+    (LogParser.DISCONNECT_PREFIX, LogParser.parse_disconnect),
+    (LogParser.MAP_CHANGE_PREFIX, LogParser.parse_map_change),
+)
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import os
+import time
+import metrics
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+FINGERPRINT_BYTES = 1024
+LINE_HASH_BYTES = 4096
+
+class LogReader:
+    """Reads a log file incrementally from a byte-offset checkpoint.
+
+    The checkpoint records the file's inode, size and byte offset plus a
+    fingerprint of the first bytes of the file and a hash of the last line
+    read, so a rotated, truncated or rewritten log is detected and read again
+    from the start. checkpoint() may also be taken part way through
+    read_lines(); it then covers the lines handed out so far.
+    """
+
+    def __init__(self, path, checkpoint=None):
+        self.path = path
+        checkpoint = checkpoint or {}
+        self.inode = checkpoint.get('inode')
+        self.size = checkpoint.get('size', 0)
+        self.offset = checkpoint.get('offset', 0)
+        self.fingerprint = checkpoint.get('fingerprint', '')
+        self.line_hash = checkpoint.get('line_hash')
+        self._file = None
+        # Raw last line handed out by a read that hasn't finished yet
+        self._last_line = None
+
+    @staticmethod
+    def compute_fingerprint(f, length):
+        f.seek(0)
+        return hashlib.sha1(f.read(min(length, FINGERPRINT_BYTES))).hexdigest()
+
+    @staticmethod
+    def compute_line_hash(f, offset):
+        """Hash of the line that ends at offset (its last LINE_HASH_BYTES at most)."""
+        start = max(0, offset - LINE_HASH_BYTES)
+        f.seek(start)
+        tail = f.read(offset - start)
+        return hashlib.sha1(tail[tail.rfind(b'\n', 0, len(tail) - 1) + 1:]).hexdigest()
+
+    def has_checkpoint(self):
+        return self.inode is not None
+
+    def _validate(self, f, stat):
+        if self.inode is None:
+            return
+        if stat.st_ino != self.inode:
+            logging.info(f"Log file {self.path} was rotated (inode changed), reading from start")
+            self.offset = 0
+        elif stat.st_size < self.offset:
+            logging.info(f"Log file {self.path} was truncated, reading from start")
+            self.offset = 0
+        elif self.compute_fingerprint(f, self.offset) != self.fingerprint or \
+                (self.line_hash and self.compute_line_hash(f, self.offset) != self.line_hash):
+            logging.info(f"Log file {self.path} content changed, reading from start")
+            self.offset = 0
+
+    def _open(self):
+        f = open(self.path, 'rb')
+        self._validate(f, os.fstat(f.fileno()))
+        self.inode = os.fstat(f.fileno()).st_ino
+        self._file = f
+
+    def _rotated(self):
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return False
+
+    def _read_open_file(self):
+        f = self._file
+        stat = os.fstat(f.fileno())
+        if stat.st_size < self.offset:
+            logging.info(f"Log file {self.path} was truncated, reading from start")
+            self.offset = 0
+        f.seek(self.offset)
+        self._last_line = None
+        line_count = 0
+        try:
+            for raw_line in f:
+                if not raw_line.endswith(b'\n'):
+                    break
+                self.offset += len(raw_line)
+                self._last_line = raw_line
+                line_count += 1
+                yield raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+        finally:
+            metrics.lines_read.inc(line_count)
+        self.size = max(stat.st_size, self.offset)
+        metrics.lag_bytes.set(max(0, os.fstat(f.fileno()).st_size - self.offset), path=self.path)
+        self.fingerprint = self.compute_fingerprint(f, self.offset)
+        self.line_hash = self.compute_line_hash(f, self.offset)
+        self._last_line = None
+
+    def read_lines(self):
+        """Yield complete lines appended since the checkpoint.
+
+        A trailing line without a newline is left unread so it is picked up
+        once the writer finishes it. The file stays open between calls; when
+        the path is rotated to a new file the rest of the old one is drained
+        before switching over.
+        """
+        if self._file is None:
+            self._open()
+        elif self._rotated():
+            yield from self._read_open_file()
+            logging.info(f"Log file {self.path} was rotated, switching to the new file")
+            self.close()
+            self.inode = None
+            self.offset = 0
+            self._open()
+        yield from self._read_open_file()
+
+    def checkpoint(self):
+        if self._last_line is not None:
+            # Mid-read: pread leaves the position of the file being iterated alone, and the
+            # last line's own bytes are what compute_line_hash would read back. The size is
+            # the offset so the unread rest of the file still counts as new input.
+            return {
+                'inode': self.inode,
+                'size': self.offset,
+                'offset': self.offset,
+                'fingerprint': hashlib.sha1(os.pread(self._file.fileno(), min(self.offset, FINGERPRINT_BYTES),
+                                                     0)).hexdigest(),
+                'line_hash': hashlib.sha1(self._last_line[-LINE_HASH_BYTES:]).hexdigest()
+            }
+        return {
+            'inode': self.inode,
+            'size': self.size,
+            'offset': self.offset,
+            'fingerprint': self.fingerprint,
+            'line_hash': self.line_hash
+        }
+
+    def close(self):
+        if self._file is not None:
+            if self._last_line is not None:
+                # A read stopped part way; keep its checkpoint valid once the file is gone
+                checkpoint = self.checkpoint()
+                self.size, self.fingerprint, self.line_hash = \
+                    checkpoint['size'], checkpoint['fingerprint'], checkpoint['line_hash']
+                self._last_line = None
+            self._file.close()
+            self._file = None
+
+class LogFollower:
+    """Yields batches of new lines from a LogReader as the file grows.
+
+    Uses inotify when the optional inotify_simple package is installed and
+    falls back to polling every poll_interval seconds otherwise.
+    """
+
+    def __init__(self, reader, poll_interval=1.0):
+        self.reader = reader
+        self.poll_interval = poll_interval
+        self._inotify = None
+        if inotify_simple is not None:
+            flags = inotify_simple.flags
+            self._inotify = inotify_simple.INotify()
+            # Watch the directory so rotation (a new file at the same path) wakes us too
+            self._inotify.add_watch(os.path.dirname(os.path.abspath(reader.path)),
+                                    flags.MODIFY | flags.CREATE | flags.MOVED_TO)
+            logging.info(f"Following {reader.path} with inotify")
+        else:
+            logging.info(f"Following {reader.path} by polling every {poll_interval}s")
+
+    def _wait(self):
+        if self._inotify is not None:
+            self._inotify.read(timeout=int(self.poll_interval * 1000))
+        else:
+            time.sleep(self.poll_interval)
+
+    def batches(self):
+        while True:
+            try:
+                lines = list(self.reader.read_lines())
+            except FileNotFoundError:
+                logging.warning(f"Log file {self.reader.path} not found, waiting for it to appear")
+                lines = []
+            if lines:
+                yield lines
+            else:
+                self._wait()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+        self.reader.close()
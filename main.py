@@ -1,13 +1,19 @@
-import json
+import time
+STARTED = time.perf_counter()
+
+import argparse
 import logging
 import os
-from datetime import datetime, timedelta
-from config import LOG_FILE, LAST_PROCESSED_FILE
-from log_parser import LogParser
+import sqlite3
+from config import DB_FILE, SERVERS, METRICS_PORT, EXPORT_DIR, RETENTION_DAYS, OUTBOX_MAX_ATTEMPTS
 from database_manager import DatabaseManager
-from message_generator import MessageGenerator
-from discord_notifier import DiscordNotifier
+from outbox import Outbox, OutboxDispatcher
+from retention import Retention
 from openai_handler import OpenAIHandler
+from session_tracker import SessionTracker
+from pipeline import (Pipeline, Ingester, DatabaseSink, SessionSink, DiscordEventSink, SummarySink, ExportSink,
+                      scoreboard_sender, state_file)
+import metrics
 
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -16,80 +22,112 @@ logging.basicConfig(level=logging.DEBUG,
                         logging.StreamHandler()
                     ])
 
-def get_last_processed_info():
-    try:
-        with open(LAST_PROCESSED_FILE, 'r') as f:
-            data = json.load(f)
-            return datetime.fromisoformat(data.get('last_processed_time', datetime.min.isoformat())), \
-                   data.get('last_summary', '')
-    except (FileNotFoundError, json.JSONDecodeError):
-        return datetime.min, ''
+def parse_args():
+    parser = argparse.ArgumentParser(description="Process HL2DM event logs")
+    parser.add_argument('--follow', action='store_true',
+                        help="keep running and process new log lines as they are written")
+    return parser.parse_args()
 
-def save_processed_info(processed_time, summary):
-    with open(LAST_PROCESSED_FILE, 'w') as f:
-        json.dump({
-            'last_processed_time': processed_time.isoformat(),
-            'last_summary': summary
-        }, f)
+def elapsed_ms():
+    return (time.perf_counter() - STARTED) * 1000
 
-def parse_log_timestamp(line):
+def has_new_input():
+    """Cheap check for cron runs: has any log changed since its checkpoint, or is a notification undelivered?
+
+    Only stats the logs and reads the checkpoints table, so a run with
+    nothing to do exits before the database, OpenAI or Discord are set up.
+    """
+    try:
+        conn = sqlite3.connect(f'file:{DB_FILE}?mode=ro', uri=True)
+    except sqlite3.Error:
+        return True
     try:
-        timestamp_str = line.split(': ', 1)[0][2:]  # Remove 'L ' prefix and split
-        return datetime.strptime(timestamp_str, '%m/%d/%Y - %H:%M:%S')
-    except (ValueError, IndexError):
-        logging.warning(f"Failed to parse timestamp from line: {line}")
-        return None
+        for server_id, log_file in SERVERS:
+            row = conn.execute('SELECT inode, size FROM checkpoints WHERE source = ?', (server_id,)).fetchone()
+            if row is None:
+                return True
+            try:
+                stat = os.stat(log_file)
+            except (OSError, TypeError):
+                logging.warning(f"Log file {log_file} for server {server_id} not found.")
+                continue
+            if (stat.st_ino, stat.st_size) != row:
+                return True
+        return conn.execute('SELECT 1 FROM outbox WHERE sent_at IS NULL AND attempts < ? LIMIT 1',
+                            (OUTBOX_MAX_ATTEMPTS,)).fetchone() is not None
+    except sqlite3.Error:
+        # Older schema without checkpoints; let the full run migrate it
+        return True
+    finally:
+        conn.close()
 
 def main():
+    args = parse_args()
     logging.info("Script started")
+    if not args.follow and not has_new_input():
+        logging.info(f"Nothing new to process, exiting after {elapsed_ms():.1f} ms")
+        return
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
     db_manager = DatabaseManager()
     ai = OpenAIHandler(os.environ.get("OPENAI_API_KEY"))
-    last_processed_time, last_summary = get_last_processed_info()
 
-    if not os.path.exists(LOG_FILE):
-        logging.error(f"Log file {LOG_FILE} not found.")
-        return
+    # Notifications are committed to the outbox with their events and delivered by the dispatcher;
+    # the outbox, the AI summary and the export are shared by all servers
+    dispatcher = OutboxDispatcher(wake=db_manager.outbox_committed)
+    dispatcher.start()
+    # Pruning runs on its own connection in short batches alongside ingestion
+    retention = Retention() if RETENTION_DAYS else None
+    if retention is not None:
+        retention.start()
+    notifier = Outbox(db_manager)
+    export_sinks = [ExportSink(EXPORT_DIR)] if EXPORT_DIR else []
+    shared_sinks = [SummarySink(ai, notifier, db_manager)] + export_sinks
+    # Only tag messages with the server once there is more than one
+    labelled = len(SERVERS) > 1
 
-    new_events = []
-    latest_timestamp = last_processed_time
-
-    with open(LOG_FILE, 'r') as f:
-        for line in f:
-            line_timestamp = parse_log_timestamp(line)
-            if line_timestamp is None:
-                continue
-
-            if line_timestamp > last_processed_time:
-                event = LogParser.parse_line(line.strip())
-                if event:
-                    new_events.append(line.strip())
-                    latest_timestamp = max(latest_timestamp, line_timestamp)
-
-    if new_events:
-        new_events_text = "\n".join(new_events)
-        summary = ai.generate_summary(last_summary, new_events_text)
-        DiscordNotifier.send_notification(summary)
-        save_processed_info(latest_timestamp, summary)
+    pipelines = []
+    storage = {}
+    for server_id, log_file in SERVERS:
+        if not log_file or not os.path.exists(log_file):
+            logging.error(f"Log file {log_file} for server {server_id} not found.")
+            continue
+        label = server_id if labelled else None
+        sessions = SessionTracker(db_manager, scoreboard_sender(notifier, label), server_id)
+        pipeline = Pipeline(log_file, db_manager, [], state_file(server_id), server_id)
+        storage[pipeline] = [DatabaseSink(db_manager, server_id), SessionSink(sessions)]
+        pipeline.sinks = storage[pipeline] + shared_sinks
+        pipelines.append(pipeline)
+    if not pipelines:
+        db_manager.close()
+        dispatcher.close()
+        if retention is not None:
+            retention.close()
+        return
 
-        # Process events for database updates
-        for event_line in new_events:
-            event = LogParser.parse_line(event_line)
-            if event['type'] == 'connect':
-                db_manager.update_player(event['steam_id'], event['player_name'], event['timestamp'])
-            elif event['type'] == 'disconnect':
-                steam_id = db_manager.get_player_steam_id(event['player_name'])
-                if steam_id:
-                    db_manager.update_player(steam_id, event['player_name'], event['timestamp'])
-            elif event['type'] == 'kill':
-                db_manager.record_kill(event['timestamp'], event['attacker_steam_id'], event['victim_steam_id'],
-                                       event['weapon'], event['attacker_health'], event['distance'], event['headshot'])
-                db_manager.update_player(event['attacker_steam_id'], event['attacker_name'], event['timestamp'])
-                db_manager.update_player(event['victim_steam_id'], event['victim_name'], event['timestamp'])
-            elif event['type'] == 'map_change':
-                db_manager.record_map_change(event['timestamp'], event['map_name'])
+    logging.info(f"Started in {elapsed_ms():.1f} ms")
+    # Catch up on everything written since the last run with one AI summary
+    ingester = Ingester(pipelines)
+    try:
+        ingester.run_once()
 
-    db_manager.close()
-    logging.info("Script execution finished")
+        if args.follow:
+            # From here on events are posted to Discord one by one as they arrive
+            for pipeline in pipelines:
+                label = pipeline.server_id if labelled else None
+                pipeline.sinks = storage[pipeline] + export_sinks + [DiscordEventSink(notifier, label)]
+            ingester.follow()
+            for sink in export_sinks:
+                sink.end_run()
+    finally:
+        # Whatever happened, deliver the notifications that did commit
+        ingester.close()
+        db_manager.close()
+        dispatcher.close()
+        if retention is not None:
+            retention.close()
+    metrics.log_stats()
+    logging.info(f"Script execution finished in {elapsed_ms():.1f} ms")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
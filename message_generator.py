@@ -30,6 +30,7 @@ class MessageGenerator:
             'rpg_missile': [f"{attacker} reduced {victim} to giblets with a well-placed rocket",
                             f"{victim} couldn't outrun {attacker}'s rocket"],
             'physics': [f"{victim} succumbed to the laws of physics, courtesy of {attacker}"],
+            'physcannon': [f"{victim} ran into a hard place, courtesy of {attacker}"],
         }
 
         for weapon_type, messages in weapon_messages.items():
@@ -40,4 +41,23 @@ class MessageGenerator:
 
     @staticmethod
     def generate_map_change_message(map_name):
-        return f"🗺️ Map changed to: {map_name}"
\ No newline at end of file
+        return f"🗺️ Map changed to: {map_name}"
+
+    @staticmethod
+    def generate_scoreboard_message(map_name, players, limit=10):
+        lines = [f"🏁 {map_name} is over! Final scoreboard:"]
+        for rank, player in enumerate(players[:limit], 1):
+            lines.append(f"{rank}. {player.name}: {player.kills} kills / {player.deaths} deaths")
+        return "\n".join(lines)
+
+    @staticmethod
+    def generate_event_message(event):
+        if event.type == 'connect':
+            return MessageGenerator.generate_connect_message(event.player_name)
+        if event.type == 'disconnect':
+            return MessageGenerator.generate_disconnect_message(event.player_name)
+        if event.type == 'kill':
+            return MessageGenerator.generate_kill_message(event.attacker_name, event.victim_name, event.weapon)
+        if event.type == 'map_change':
+            return MessageGenerator.generate_map_change_message(event.map_name)
+        return None
\ No newline at end of file
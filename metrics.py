@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond parsing up to slow network calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        """Copy of the values; other threads add label keys while /metrics or log_stats reads."""
+        with self.lock:
+            return dict(self.values)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = value
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.total += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def exposition(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.total, self.count
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+def format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in key) + '}'
+
+lines_read = Counter('hl2dm_lines_read_total', 'Log lines read')
+events_parsed = Counter('hl2dm_events_total', 'Log lines matched, by event type')
+parse_seconds = Histogram('hl2dm_parse_seconds', 'Time spent parsing a batch of lines')
+db_flush_seconds = Histogram('hl2dm_db_flush_seconds', 'Time spent committing a DB batch')
+discord_seconds = Histogram('hl2dm_discord_request_seconds', 'Discord webhook request latency')
+discord_messages = Counter('hl2dm_discord_posts_total', 'Discord webhook posts, by result')
+openai_seconds = Histogram('hl2dm_openai_request_seconds', 'OpenAI request latency')
+discord_queue_depth = Gauge('hl2dm_discord_queue_depth', 'Messages waiting for Discord delivery')
+lag_bytes = Gauge('hl2dm_log_lag_bytes', 'Bytes between the read offset and the end of the log file')
+
+REGISTRY = [lines_read, events_parsed, parse_seconds, db_flush_seconds, discord_seconds, discord_messages,
+            openai_seconds, discord_queue_depth, lag_bytes]
+
+def exposition():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.exposition())
+    return '\n'.join(lines) + '\n'
+
+def start_http_server(port, host='0.0.0.0'):
+    """Serve /metrics in Prometheus text format from a background thread."""
+    # Imported here so cron runs without a metrics port don't pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = exposition().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+def log_stats():
+    """Write a one-line snapshot of the main counters to the log."""
+    events = ', '.join(f"{dict(key).get('type')}={value}" for key, value in sorted(events_parsed.snapshot().items()))
+    logging.info(f"Stats: lines={sum(lines_read.snapshot().values())} events[{events}] "
+                 f"parse={parse_seconds.total:.3f}s db={db_flush_seconds.total:.3f}s "
+                 f"discord={discord_seconds.total:.3f}s/{discord_seconds.count} "
+                 f"openai={openai_seconds.total:.3f}s/{openai_seconds.count} "
+                 f"queue={sum(discord_queue_depth.snapshot().values())} lag={sum(lag_bytes.snapshot().values())}B")
@@ -1,15 +1,24 @@
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
 class OpenAIHandler:
     
     def __init__(self, api_key):
-       self.client = OpenAI(
-            api_key=api_key,
-        )
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        # openai pulls in httpx and pydantic; only import and build the client once a summary is needed
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(
+                api_key=self.api_key,
+            )
+        return self._client
     
     def generate_summary(self, previous_summary, new_events):
        
@@ -33,13 +42,14 @@ be like howard cosell in your commentary. not too hyperbolic
 
 """
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes Half-Life 2 Deathmatch game events in a sports play by play type of summary. The summaries should be suitible for a discord message. it shouldn't be super long and prose. it should be like a excited PLAY BY PLAY"},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with metrics.openai_seconds.time():
+            response = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that summarizes Half-Life 2 Deathmatch game events in a sports play by play type of summary. The summaries should be suitible for a discord message. it shouldn't be super long and prose. it should be like a excited PLAY BY PLAY"},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         print(response.choices[0].message.content)
 
         return response.choices[0].message.content
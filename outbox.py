@@ -0,0 +1,145 @@
+import argparse
+import logging
+import sqlite3
+import threading
+from config import DB_FILE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS, OUTBOX_CLAIM_TIMEOUT
+from discord_notifier import DiscordNotifier, MAX_MESSAGE_LENGTH
+import metrics
+
+BATCH_ROWS = 100
+
+class Outbox:
+    """Notifier for the sinks that queues messages in the outbox table.
+
+    Messages commit in the same transaction as the events and checkpoint
+    that produced them, so a crash either keeps all three or none.
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def send(self, content):
+        for chunk in DiscordNotifier.split_message(content):
+            self.db_manager.queue_notification(chunk)
+
+class OutboxDispatcher:
+    """Delivers committed outbox messages to Discord and marks them sent.
+
+    Runs on its own SQLite connection, either as a background thread next
+    to the ingester or on its own from the command line. Pending rows are
+    coalesced into posts of up to 2000 characters in id order. A post that
+    Discord does not accept stays pending and is retried on the next pass,
+    up to OUTBOX_MAX_ATTEMPTS times. A crash between Discord accepting a
+    post and the rows being marked sent can repeat that one post.
+
+    Rows are claimed before they are posted, so several dispatchers on the
+    same database (a cron run next to outbox.py --follow) never post the
+    same row twice. A claim older than claim_timeout seconds is taken to
+    belong to a dispatcher that died and is claimed again. Pass the
+    DatabaseManager's outbox_committed event as wake to deliver new rows as
+    soon as they commit rather than on the next poll.
+    """
+
+    def __init__(self, db_file=DB_FILE, notifier=None, poll_interval=OUTBOX_POLL_INTERVAL,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, claim_timeout=OUTBOX_CLAIM_TIMEOUT, wake=None):
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.notifier = notifier or DiscordNotifier()
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.wake = wake or threading.Event()
+        self._stop = threading.Event()
+        self.thread = None
+
+    def _next_batch(self):
+        """Claim the next run of pending rows that fits in one post."""
+        with self.conn:
+            # Take the write lock before reading so no other dispatcher can claim the same rows in between
+            self.conn.execute('BEGIN IMMEDIATE')
+            rows = self.conn.execute('''SELECT id, content FROM outbox WHERE sent_at IS NULL AND attempts < ?
+                                        AND (claimed_at IS NULL OR claimed_at < datetime('now', ?))
+                                        ORDER BY id LIMIT ?''',
+                                     (self.max_attempts, f'-{self.claim_timeout} seconds', BATCH_ROWS)).fetchall()
+            ids = []
+            parts = []
+            length = -1
+            for row_id, content in rows:
+                if parts and length + 1 + len(content) > MAX_MESSAGE_LENGTH:
+                    break
+                ids.append(row_id)
+                parts.append(content)
+                length += 1 + len(content)
+            if ids:
+                self.conn.execute(f'''UPDATE outbox SET claimed_at = CURRENT_TIMESTAMP
+                                      WHERE id IN ({', '.join('?' * len(ids))})''', ids)
+        return ids, '\n'.join(parts)
+
+    def _mark(self, ids, sent):
+        placeholders = ', '.join('?' * len(ids))
+        if sent:
+            sql = f'UPDATE outbox SET sent_at = CURRENT_TIMESTAMP, claimed_at = NULL WHERE id IN ({placeholders})'
+        else:
+            sql = f'UPDATE outbox SET attempts = attempts + 1, claimed_at = NULL WHERE id IN ({placeholders})'
+        with self.conn:
+            self.conn.execute(sql, ids)
+
+    def pending(self):
+        return self.conn.execute('SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL AND attempts < ?',
+                                 (self.max_attempts,)).fetchone()[0]
+
+    def drain(self):
+        """Deliver pending messages; returns False if a post failed and was left for later."""
+        while True:
+            metrics.discord_queue_depth.set(self.pending())
+            ids, content = self._next_batch()
+            if not ids:
+                return True
+            delivered = self.notifier.deliver(content)
+            self._mark(ids, delivered)
+            if not delivered:
+                return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                # Keep the dispatcher alive; the rows stay pending for the next pass
+                logging.exception("Unexpected error draining the outbox")
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stop the background thread, make a last delivery pass and release the connection."""
+        if self.thread is not None:
+            self._stop.set()
+            self.wake.set()
+            self.thread.join()
+        try:
+            self.drain()
+        except Exception:
+            logging.exception("Unexpected error draining the outbox")
+        self.notifier.close()
+        self.conn.close()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Deliver pending Discord notifications from the outbox table")
+    parser.add_argument('--db', default=DB_FILE)
+    parser.add_argument('--follow', action='store_true', help="keep polling for new notifications")
+    args = parser.parse_args()
+    dispatcher = OutboxDispatcher(args.db)
+    if args.follow:
+        dispatcher.start()
+        try:
+            dispatcher.thread.join()
+        except KeyboardInterrupt:
+            logging.info("Dispatcher interrupted")
+    dispatcher.close()
+
+if __name__ == "__main__":
+    main()
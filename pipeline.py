@@ -0,0 +1,298 @@
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from config import (LAST_PROCESSED_FILE, FOLLOW_POLL_INTERVAL, STATS_INTERVAL, DEBUG_LOG_SAMPLE,
+                    DEFAULT_SERVER_ID, INGEST_QUEUE_SIZE, INGEST_BATCH_LINES, EXPORT_INTERVAL, EXPORT_MIN_ROWS)
+from log_parser import LogParser, TIMESTAMP_FORMAT
+from log_reader import LogReader, LogFollower
+from message_generator import MessageGenerator
+from summarizer import EventDigest, Summarizer
+import metrics
+
+def state_file(server_id):
+    """JSON state file a server used before checkpoints moved into the database."""
+    if server_id == DEFAULT_SERVER_ID:
+        return LAST_PROCESSED_FILE
+    return f'last_processed.{server_id}.json'
+
+def load_state(path=LAST_PROCESSED_FILE):
+    """Read a legacy JSON state file: last event time, last AI summary and the log checkpoint."""
+    state = {'last_processed_time': datetime.min, 'last_summary': '', 'checkpoint': None}
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return state
+    try:
+        if 'last_processed_time' in data:
+            state['last_processed_time'] = datetime.fromisoformat(data['last_processed_time'])
+        elif 'last_processed' in data:
+            # Format written by the old standalone hl2dm_log_processor
+            state['last_processed_time'] = datetime.strptime(data['last_processed'], TIMESTAMP_FORMAT)
+    except ValueError as e:
+        logging.error(f"Error reading {path}: {str(e)}")
+    state['last_summary'] = data.get('last_summary', '')
+    state['checkpoint'] = data.get('checkpoint')
+    return state
+
+class Sink:
+    """One output stage of the pipeline.
+
+    handle() sees every new event; end_batch() runs before the batch's DB
+    transaction commits and after_commit() once it has; end_run() runs once
+    the whole run has been read. Sinks that notify write to an Outbox, so
+    their messages commit with the batch.
+    """
+
+    def handle(self, event):
+        pass
+
+    def end_batch(self):
+        pass
+
+    def after_commit(self):
+        pass
+
+    def end_run(self):
+        pass
+
+class DatabaseSink(Sink):
+    def __init__(self, db_manager, server_id=DEFAULT_SERVER_ID):
+        self.db_manager = db_manager
+        self.server_id = server_id
+
+    def handle(self, event):
+        self.db_manager.record_event(event, self.server_id)
+
+class SessionSink(Sink):
+    """Feeds the map-session tracker; must come after DatabaseSink."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def handle(self, event):
+        self.tracker.add(event)
+
+    def end_batch(self):
+        self.tracker.save()
+
+class DiscordEventSink(Sink):
+    """Posts one Discord message per event, prefixed with the server label if one is given."""
+
+    def __init__(self, notifier, label=None):
+        self.notifier = notifier
+        self.prefix = f"[{label}] " if label else ''
+
+    def handle(self, event):
+        self.notifier.send(self.prefix + MessageGenerator.generate_event_message(event))
+
+class SummarySink(Sink):
+    """Folds the run's events into a digest and posts one AI summary at the end."""
+
+    def __init__(self, ai, notifier, db_manager):
+        self.ai = ai
+        self.notifier = notifier
+        self.db_manager = db_manager
+        self.digest = EventDigest()
+
+    def handle(self, event):
+        self.digest.add(event)
+
+    def end_run(self):
+        if not self.digest.event_count:
+            return
+        summary = Summarizer(self.ai).summarize(self.db_manager.get_meta('last_summary', ''), self.digest)
+        with self.db_manager.batch():
+            self.notifier.send(summary)
+            self.db_manager.set_meta('last_summary', summary)
+        self.digest = EventDigest()
+
+class ExportSink(Sink):
+    """Appends new rows to the Parquet export.
+
+    A run exports at its end once min_rows new rows have built up, or once
+    the last export is interval seconds old, so frequent cron runs don't
+    leave a tiny file in every partition. In follow mode, where a run never
+    ends, the export is retried every interval seconds between batches.
+    """
+
+    def __init__(self, export_dir, min_rows=EXPORT_MIN_ROWS, interval=EXPORT_INTERVAL):
+        self.export_dir = export_dir
+        self.min_rows = min_rows
+        self.interval = interval
+        self.seen_events = False
+        self.next_export = time.monotonic() + interval
+
+    def handle(self, event):
+        self.seen_events = True
+
+    def after_commit(self):
+        # Only once the batch is committed, so the export neither holds the write
+        # transaction open nor can roll the batch back
+        if time.monotonic() >= self.next_export:
+            self.export()
+
+    def end_run(self):
+        if self.seen_events:
+            self.export()
+
+    def export(self):
+        self.seen_events = False
+        self.next_export = time.monotonic() + self.interval
+        try:
+            # Imported here so pyarrow is only needed when the export is turned on
+            from export import ParquetExporter
+            ParquetExporter(export_dir=self.export_dir).export(self.min_rows, self.interval)
+        except Exception:
+            # The rows stay in the database; a later export picks them up
+            logging.exception(f"Parquet export to {self.export_dir} failed")
+
+def scoreboard_sender(notifier, label=None):
+    """on_session_end callback for SessionTracker that posts the final scoreboard."""
+    prefix = f"[{label}] " if label else ''
+    def send_scoreboard(map_name, started_at, ended_at, players):
+        if players:
+            notifier.send(prefix + MessageGenerator.generate_scoreboard_message(map_name, players))
+    return send_scoreboard
+
+class Pipeline:
+    """Parses one server's log lines once and fans the events out to the sinks.
+
+    Ingester does the reading. Each batch of lines is written in one DB
+    transaction together with the reader checkpoint and any notifications
+    it produced, so a restart picks up exactly where the last commit left
+    off.
+    """
+
+    def __init__(self, log_file, db_manager, sinks, state_path=LAST_PROCESSED_FILE, server_id=DEFAULT_SERVER_ID):
+        self.server_id = server_id
+        self.db_manager = db_manager
+        self.sinks = list(sinks)
+        saved = db_manager.get_checkpoint(server_id)
+        if saved is None:
+            # First run since checkpoints moved into the database; carry the JSON state over
+            legacy = load_state(state_path)
+            saved = legacy['checkpoint'], legacy['last_processed_time']
+            if legacy['last_summary'] and db_manager.get_meta('last_summary') is None:
+                db_manager.set_meta('last_summary', legacy['last_summary'])
+        checkpoint, self.last_processed_time = saved
+        self.reader = LogReader(log_file, checkpoint)
+
+    def parse(self, lines, after=None):
+        """Parse a batch of lines into events, skipping any not later than after.
+
+        Touches neither the DB nor the sinks.
+        """
+        events = []
+        for event_number, event in enumerate(LogParser.parse_lines(lines), 1):
+            if event_number % DEBUG_LOG_SAMPLE == 0:
+                logging.debug("Processing event %d: %s", event_number, event.line)
+            if after is not None and event.time <= after:
+                continue
+            events.append(event)
+        return events
+
+    def write(self, events, checkpoint):
+        """Push parsed events through the sinks and save the checkpoint, all in one transaction."""
+        last_processed_time = max([self.last_processed_time] + [event.time for event in events])
+        with self.db_manager.batch():
+            for event in events:
+                for sink in self.sinks:
+                    sink.handle(event)
+            for sink in self.sinks:
+                sink.end_batch()
+            self.db_manager.save_checkpoint(self.server_id, checkpoint, last_processed_time)
+        self.last_processed_time = last_processed_time
+        for sink in self.sinks:
+            sink.after_commit()
+
+    def close(self):
+        self.reader.close()
+
+class Ingester:
+    """Ingests several log sources concurrently into one database.
+
+    Each source gets a thread that reads and parses its own log and hands
+    the parsed batches, at most batch_lines lines each, to a bounded queue;
+    when the writer falls behind, the queue fills up and the sources block
+    until it catches up. Only the calling thread touches SQLite, and each
+    source's checkpoint is saved after its batch commits. Sinks may be
+    shared between the pipelines.
+    """
+
+    def __init__(self, pipelines, queue_size=INGEST_QUEUE_SIZE, batch_lines=INGEST_BATCH_LINES):
+        self.pipelines = pipelines
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_lines = batch_lines
+
+    def _catch_up(self, pipeline):
+        reader = pipeline.reader
+        # Without a byte-offset checkpoint (first run or a pre-checkpoint state
+        # file) fall back to skipping lines by timestamp. The cutoff is taken once:
+        # the writer moves last_processed_time on after every batch, and the next
+        # batch may start within the same second.
+        after = None if reader.has_checkpoint() else pipeline.last_processed_time
+        logging.info(f"[{pipeline.server_id}] Reading {reader.path} from byte offset {reader.offset}")
+        # A long backlog commits in bounded batches, each with the checkpoint of its last line
+        lines = reader.read_lines()
+        while True:
+            batch = list(itertools.islice(lines, self.batch_lines))
+            self.queue.put((pipeline, pipeline.parse(batch, after), reader.checkpoint()))
+            if len(batch) < self.batch_lines:
+                break
+
+    def _follow(self, pipeline, poll_interval):
+        follower = LogFollower(pipeline.reader, poll_interval)
+        try:
+            for lines in follower.batches():
+                self.queue.put((pipeline, pipeline.parse(lines), pipeline.reader.checkpoint()))
+        finally:
+            follower.close()
+
+    def _source(self, target, pipeline, *args):
+        try:
+            target(pipeline, *args)
+        except Exception:
+            logging.exception(f"[{pipeline.server_id}] Reading {pipeline.reader.path} failed")
+        finally:
+            self.queue.put((pipeline, None, None))
+
+    def _run(self, target, *args):
+        for pipeline in self.pipelines:
+            threading.Thread(target=self._source, args=(target, pipeline, *args),
+                             name=f'source-{pipeline.server_id}', daemon=True).start()
+        running = len(self.pipelines)
+        next_stats = time.monotonic() + STATS_INTERVAL
+        while running:
+            pipeline, events, checkpoint = self.queue.get()
+            if events is None:
+                running -= 1
+                continue
+            pipeline.write(events, checkpoint)
+            if time.monotonic() >= next_stats:
+                metrics.log_stats()
+                next_stats = time.monotonic() + STATS_INTERVAL
+
+    def run_once(self):
+        """Catch every source up to the end of its log, then finish the run on each sink once."""
+        self._run(self._catch_up)
+        finished = set()
+        for pipeline in self.pipelines:
+            for sink in pipeline.sinks:
+                if id(sink) not in finished:
+                    finished.add(id(sink))
+                    sink.end_run()
+
+    def follow(self, poll_interval=FOLLOW_POLL_INTERVAL):
+        try:
+            self._run(self._follow, poll_interval)
+        except KeyboardInterrupt:
+            logging.info("Follow mode interrupted")
+
+    def close(self):
+        for pipeline in self.pipelines:
+            pipeline.close()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from config import DB_FILE, QUERY_API_PORT, QUERY_POOL_SIZE, QUERY_CACHE_TTL, QUERY_CACHE_SIZE
+from log_parser import parse_timestamp
+
+MAX_LIMIT = 500
+
+class ConnectionPool:
+    """Fixed set of read-only SQLite connections shared by the request threads."""
+
+    def __init__(self, db_file=DB_FILE, size=QUERY_POOL_SIZE):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            # mode=ro never takes a write lock; in WAL mode readers don't block the ingester either
+            conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True, check_same_thread=False)
+            self.connections.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+class QueryService:
+    """Read-side queries over the events database with an in-memory result cache.
+
+    Results are kept for cache_ttl seconds, and the whole cache is dropped
+    as soon as the ingester commits a new batch (the ingest_batch counter in
+    the meta table moves), so frequent polling mostly hits memory. Keys
+    come from request parameters, so the cache holds at most cache_size
+    results and drops expired ones before the least recently used.
+    """
+
+    def __init__(self, db_file=DB_FILE, pool_size=QUERY_POOL_SIZE, cache_ttl=QUERY_CACHE_TTL,
+                 cache_size=QUERY_CACHE_SIZE):
+        self.pool = ConnectionPool(db_file, pool_size)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def _fetch(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _cached(self, key, compute):
+        generation = self._fetch("SELECT value FROM meta WHERE key = 'ingest_batch'")
+        now = time.monotonic()
+        with self.lock:
+            if generation != self.generation:
+                self.cache.clear()
+                self.generation = generation
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.cache.move_to_end(key)
+                    return entry[1]
+                del self.cache[key]
+        value = compute()
+        with self.lock:
+            if generation == self.generation:
+                self.cache[key] = (now + self.cache_ttl, value)
+                if len(self.cache) > self.cache_size:
+                    self._evict(now)
+        return value
+
+    def _evict(self, now):
+        for key in [key for key, (expires, _) in self.cache.items() if expires <= now]:
+            del self.cache[key]
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def leaderboard(self, limit=10):
+        def compute():
+            rows = self._fetch('''SELECT s.steam_id, p.player_name, s.kills, s.deaths, s.suicides, s.headshots
+                                  FROM player_stats s LEFT JOIN players p ON p.steam_id = s.steam_id
+                                  ORDER BY s.kills DESC LIMIT ?''', (limit,))
+            return [{'steam_id': steam_id, 'player_name': name, 'kills': kills, 'deaths': deaths,
+                     'suicides': suicides, 'headshots': headshots,
+                     'kd': round(kills / deaths, 2) if deaths else None}
+                    for steam_id, name, kills, deaths, suicides, headshots in rows]
+        return self._cached(('leaderboard', limit), compute)
+
+    def weapons(self):
+        def compute():
+            rows = self._fetch('SELECT weapon, kills, headshots, total_distance FROM weapon_stats ORDER BY kills DESC')
+            return [{'weapon': weapon, 'kills': kills, 'headshots': headshots,
+                     'average_distance': round(distance / kills, 1) if kills else None}
+                    for weapon, kills, headshots, distance in rows]
+        return self._cached(('weapons',), compute)
+
+    def player(self, steam_id):
+        def compute():
+            player = self._fetch('SELECT player_name, last_seen FROM players WHERE steam_id = ?', (steam_id,))
+            if not player:
+                return None
+            stats = self._fetch('''SELECT kills, deaths, suicides, headshots, total_distance
+                                   FROM player_stats WHERE steam_id = ?''', (steam_id,))
+            kills, deaths, suicides, headshots, distance = stats[0] if stats else (0, 0, 0, 0, 0.0)
+            names = self._fetch('SELECT player_name, first_seen, last_seen FROM player_names WHERE steam_id = ?',
+                                (steam_id,))
+            # Log timestamps are month-first strings, so order the history by parsed time
+            names.sort(key=lambda row: parse_timestamp(row[1]))
+            # From the aggregate, so kills archived by retention still count
+            weapons = self._fetch('''SELECT weapon, kills FROM player_weapon_stats WHERE steam_id = ?
+                                     ORDER BY kills DESC LIMIT 5''', (steam_id,))
+            return {
+                'steam_id': steam_id,
+                'player_name': player[0][0],
+                'last_seen': player[0][1],
+                'kills': kills,
+                'deaths': deaths,
+                'suicides': suicides,
+                'headshots': headshots,
+                'kd': round(kills / deaths, 2) if deaths else None,
+                'average_distance': round(distance / kills, 1) if kills else None,
+                'favorite_weapons': [{'weapon': weapon, 'kills': count} for weapon, count in weapons],
+                'names': [{'player_name': name, 'first_seen': first_seen, 'last_seen': last_seen}
+                          for name, first_seen, last_seen in names],
+            }
+        return self._cached(('player', steam_id), compute)
+
+    def recent_kills(self, limit=20, server_id=None):
+        def compute():
+            # rowid follows insertion order, which is log order for each server
+            rows = self._fetch('''SELECT k.timestamp, k.server_id, k.attacker_steam_id, a.player_name,
+                                         k.victim_steam_id, v.player_name, k.weapon, k.distance, k.headshot
+                                  FROM kills k
+                                  LEFT JOIN players a ON a.steam_id = k.attacker_steam_id
+                                  LEFT JOIN players v ON v.steam_id = k.victim_steam_id
+                                  WHERE ? IS NULL OR k.server_id = ?
+                                  ORDER BY k.rowid DESC LIMIT ?''', (server_id, server_id, limit))
+            return [{'timestamp': timestamp, 'server_id': server, 'attacker_steam_id': attacker_id,
+                     'attacker_name': attacker_name, 'victim_steam_id': victim_id, 'victim_name': victim_name,
+                     'weapon': weapon, 'distance': distance, 'headshot': bool(headshot)}
+                    for timestamp, server, attacker_id, attacker_name, victim_id, victim_name,
+                        weapon, distance, headshot in rows]
+        return self._cached(('recent_kills', limit, server_id), compute)
+
+    def map_history(self, limit=20, server_id=None):
+        def compute():
+            rows = self._fetch('''SELECT id, server_id, map_name, started_at, ended_at, kills, headshots
+                                  FROM map_sessions WHERE ? IS NULL OR server_id = ?
+                                  ORDER BY id DESC LIMIT ?''', (server_id, server_id, limit))
+            return [{'session_id': session_id, 'server_id': server, 'map_name': map_name,
+                     'started_at': started_at, 'ended_at': ended_at, 'kills': kills, 'headshots': headshots}
+                    for session_id, server, map_name, started_at, ended_at, kills, headshots in rows]
+        return self._cached(('map_history', limit, server_id), compute)
+
+    def close(self):
+        self.pool.close()
+
+def _limit(params, default):
+    try:
+        return max(1, min(int(params.get('limit', [default])[0]), MAX_LIMIT))
+    except ValueError:
+        return default
+
+def route(service, path, params):
+    """Map a request path to a QueryService call; returns None for unknown paths."""
+    server_id = params.get('server', [None])[0]
+    parts = [part for part in path.split('/') if part]
+    if parts == ['leaderboard']:
+        return service.leaderboard(_limit(params, 10))
+    if parts == ['weapons']:
+        return service.weapons()
+    if len(parts) == 2 and parts[0] == 'players':
+        return service.player(parts[1])
+    if parts == ['kills', 'recent']:
+        return service.recent_kills(_limit(params, 20), server_id)
+    if parts == ['maps']:
+        return service.map_history(_limit(params, 20), server_id)
+    return None
+
+class QueryHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        try:
+            result = route(self.service, url.path, parse_qs(url.query))
+        except sqlite3.Error as e:
+            logging.error(f"Query {self.path} failed: {e}")
+            self.send_error(503)
+            return
+        if result is None:
+            self.send_error(404)
+            return
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(service, port=QUERY_API_PORT, host='0.0.0.0'):
+    handler = type('BoundQueryHandler', (QueryHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    logging.info(f"Serving the query API on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Query API interrupted")
+    finally:
+        server.server_close()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Read-only queries over the events database")
+    parser.add_argument('--db', default=DB_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the HTTP API")
+    serve_parser.add_argument('--port', type=int, default=QUERY_API_PORT)
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    commands.add_parser('leaderboard').add_argument('--limit', type=int, default=10)
+    commands.add_parser('weapons')
+    commands.add_parser('player').add_argument('steam_id')
+    for name in ('kills', 'maps'):
+        command = commands.add_parser(name)
+        command.add_argument('--limit', type=int, default=20)
+        command.add_argument('--server')
+    args = parser.parse_args()
+
+    service = QueryService(args.db)
+    try:
+        if args.command == 'serve':
+            serve(service, args.port, args.host)
+            return
+        if args.command == 'leaderboard':
+            result = service.leaderboard(args.limit)
+        elif args.command == 'weapons':
+            result = service.weapons()
+        elif args.command == 'player':
+            result = service.player(args.steam_id)
+        elif args.command == 'kills':
+            result = service.recent_kills(args.limit, args.server)
+        else:
+            result = service.map_history(args.limit, args.server)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
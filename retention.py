@@ -0,0 +1,199 @@
+import argparse
+import csv
+import gzip
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from config import DB_FILE, RETENTION_DAYS, ARCHIVE_DIR, RETENTION_INTERVAL, RETENTION_BATCH_SIZE
+from log_parser import TIMESTAMP_FORMAT, parse_db_timestamp
+
+KILL_COLUMNS = ('rowid', 'timestamp', 'server_id', 'attacker_steam_id', 'victim_steam_id', 'weapon',
+                'attacker_health', 'distance', 'headshot')
+MAP_CHANGE_COLUMNS = ('rowid', 'timestamp', 'server_id', 'map_name')
+VACUUM_PAGES = 1000
+
+def is_older(timestamp, cutoff):
+    # Timestamps are month-first strings, so the age test has to happen in Python
+    when = parse_db_timestamp(timestamp)
+    return when is not None and when < cutoff
+
+class Retention:
+    """Archives raw kills and map changes older than the retention window and prunes them.
+
+    player_stats, weapon_stats and map_sessions are updated in the same
+    transaction as every kill batch, so the totals survive pruning; only
+    per-kill detail leaves the hot database. Old rows are appended to
+    gzip-compressed CSV files per month (kills-YYYY-MM.csv.gz) and then
+    deleted in small rowid-ordered transactions, so the ingester is only
+    ever held up for one short batch. Freed pages are returned with
+    PRAGMA incremental_vacuum: a full VACUUM could renumber the rowids that
+    the Parquet export tracks. A crash between writing an archive file and
+    deleting its rows leaves those rows in both places, and the next pass
+    archives them again; the rowid column makes the duplicates easy to drop.
+    """
+
+    def __init__(self, db_file=DB_FILE, days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR,
+                 interval=RETENTION_INTERVAL, batch_size=RETENTION_BATCH_SIZE):
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        self.days = days
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self.thread = None
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def _archive(self, table, columns, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(parse_db_timestamp(row[1]).strftime('%Y-%m'), []).append(row)
+        for month, month_rows in sorted(by_month.items()):
+            path = os.path.join(self.archive_dir, f'{table}-{month}.csv.gz')
+            new_file = not os.path.exists(path)
+            # Appending adds a gzip member; gzip readers treat the members as one stream
+            with gzip.open(path, 'at', newline='') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(columns)
+                writer.writerows(month_rows)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _delete(self, table, rowids):
+        with self.conn:
+            self.conn.executemany(f'DELETE FROM {table} WHERE rowid = ?', [(rowid,) for rowid in rowids])
+
+    def _prune_kills(self, cutoff):
+        # Never delete the newest row: SQLite would hand its rowid out again and the export would skip new kills
+        newest = self.conn.execute('SELECT MAX(rowid) FROM kills').fetchone()[0]
+        last_rowid = 0
+        pruned = 0
+        while not self._stop.is_set():
+            rows = self.conn.execute(f'''SELECT {', '.join(KILL_COLUMNS)} FROM kills
+                                         WHERE rowid > ? ORDER BY rowid LIMIT ?''',
+                                     (last_rowid, self.batch_size)).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            old = [row for row in rows if row[0] != newest and is_older(row[1], cutoff)]
+            if old:
+                self._archive('kills', KILL_COLUMNS, old)
+                self._delete('kills', [row[0] for row in old])
+                pruned += len(old)
+        return pruned
+
+    def _prune_map_changes(self, cutoff):
+        rows = self.conn.execute(f'SELECT {", ".join(MAP_CHANGE_COLUMNS)} FROM map_changes ORDER BY rowid').fetchall()
+        old = [row for row in rows[:-1] if is_older(row[1], cutoff)]
+        # Keep each server's last change before the cutoff; it names the map of the oldest retained kills
+        latest = {}
+        for row in old:
+            if row[2] not in latest or parse_db_timestamp(row[1]) >= parse_db_timestamp(latest[row[2]][1]):
+                latest[row[2]] = row
+        keep = {row[0] for row in latest.values()}
+        old = [row for row in old if row[0] not in keep]
+        pruned = 0
+        for start in range(0, len(old), self.batch_size):
+            if self._stop.is_set():
+                break
+            batch = old[start:start + self.batch_size]
+            self._archive('map_changes', MAP_CHANGE_COLUMNS, batch)
+            self._delete('map_changes', [row[0] for row in batch])
+            pruned += len(batch)
+        return pruned
+
+    def _prune_outbox(self):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM outbox WHERE sent_at < datetime('now', ?)",
+                                       (f'-{self.days} days',))
+        return cursor.rowcount
+
+    def _vacuum(self):
+        if self.conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            # Databases created before auto_vacuum=INCREMENTAL reuse freed pages but never shrink
+            return 0
+        freed = self.conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # A few pages per statement keeps each write lock short
+        for _ in range(0, freed, VACUUM_PAGES):
+            if self._stop.is_set():
+                break
+            # executescript steps the pragma to completion; execute() would free a single page
+            self.conn.executescript(f'PRAGMA incremental_vacuum({VACUUM_PAGES});')
+        return freed
+
+    def run(self):
+        """Make one retention pass; returns the number of kills pruned.
+
+        A pass stopped by close() is not recorded as done, so the next start()
+        carries on with it instead of waiting out the interval.
+        """
+        started = time.perf_counter()
+        cutoff = datetime.now() - timedelta(days=self.days)
+        kills = self._prune_kills(cutoff)
+        map_changes = self._prune_map_changes(cutoff)
+        finished = not self._stop.is_set()
+        outbox = self._prune_outbox() if finished else 0
+        pages = self._vacuum() if finished else 0
+        with self.conn:
+            if kills or map_changes:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('kills_archived_before', ?)",
+                                  (cutoff.strftime(TIMESTAMP_FORMAT),))
+            if finished:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('retention_last_run', ?)",
+                                  (time.time(),))
+        logging.info(f"Retention: archived {kills} kills and {map_changes} map changes older than "
+                     f"{cutoff:%Y-%m-%d}, dropped {outbox} sent notifications, freed {pages} pages "
+                     f"in {time.perf_counter() - started:.1f}s{'' if finished else ' (stopped early)'}")
+        return kills
+
+    def seconds_until_due(self):
+        """Seconds until the next pass is due; zero or less if it is due now."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'retention_last_run'").fetchone()
+        if row is None:
+            return 0
+        return float(row[0]) + self.interval - time.time()
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.seconds_until_due()
+            if wait <= 0:
+                try:
+                    self.run()
+                except Exception:
+                    logging.exception("Retention pass failed")
+                wait = self.interval
+            self._stop.wait(wait)
+
+    def start(self):
+        """Make a pass every interval seconds on a background thread.
+
+        The time of the last pass is kept in the meta table, so short cron
+        runs only prune once per interval rather than on every run.
+        """
+        self.thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.thread is not None:
+            self._stop.set()
+            self.thread.join()
+        self.conn.close()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Archive and prune raw events older than the retention window")
+    parser.add_argument('--db', default=DB_FILE)
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS or 90)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args()
+    retention = Retention(args.db, args.days, args.archive_dir)
+    try:
+        retention.run()
+    finally:
+        retention.close()
+
+if __name__ == "__main__":
+    main()
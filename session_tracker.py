@@ -0,0 +1,119 @@
+import logging
+from datetime import datetime
+from config import DEFAULT_SERVER_ID
+from log_parser import TIMESTAMP_FORMAT
+
+class SessionPlayer:
+    __slots__ = ('name', 'kills', 'deaths', 'headshots', 'seconds_played', 'present_since')
+
+    def __init__(self, name, kills=0, deaths=0, headshots=0, seconds_played=0.0, present_since=None):
+        self.name = name
+        self.kills = kills
+        self.deaths = deaths
+        self.headshots = headshots
+        self.seconds_played = seconds_played
+        self.present_since = present_since
+
+class SessionTracker:
+    """Streaming state machine that splits the event stream into map sessions.
+
+    A session opens on each map change and closes on the next one. Kills and
+    presence intervals (connect to disconnect) are attributed to the open
+    session, and each session's per-player results are written as soon as it
+    closes. Feed events with add() after DatabaseManager.record_event(), which
+    opens the map_sessions row the tracker attaches to. Each server has its
+    own tracker.
+    """
+
+    def __init__(self, db_manager, on_session_end=None, server_id=DEFAULT_SERVER_ID):
+        self.db_manager = db_manager
+        self.server_id = server_id
+        self.on_session_end = on_session_end
+        self.session_id = None
+        self.map_name = None
+        self.started_at = None
+        self.players = {}
+        self._resume()
+
+    def _resume(self):
+        # Cron runs stop mid-map, so pick the open session back up from its last snapshot
+        session_id = self.db_manager.current_sessions.get(self.server_id)
+        if session_id is None:
+            return
+        map_name, started_at, ended_at = self.db_manager.get_map_session(session_id)
+        if ended_at is not None:
+            return
+        self.session_id = session_id
+        self.map_name = map_name
+        self.started_at = datetime.strptime(started_at, TIMESTAMP_FORMAT)
+        for steam_id, name, kills, deaths, headshots, seconds_played, present_since in \
+                self.db_manager.get_session_players(session_id):
+            present_since = datetime.strptime(present_since, TIMESTAMP_FORMAT) if present_since else None
+            self.players[steam_id] = SessionPlayer(name, kills, deaths, headshots, seconds_played, present_since)
+
+    def _player(self, steam_id, name, time):
+        player = self.players.get(steam_id)
+        if player is None:
+            player = self.players[steam_id] = SessionPlayer(name)
+        player.name = name
+        if player.present_since is None:
+            player.present_since = time
+        return player
+
+    def add(self, event):
+        if event.type == 'map_change':
+            self._close(event.time)
+            self._open(event)
+        elif self.session_id is None:
+            return
+        elif event.type == 'connect':
+            self._player(event.steam_id, event.player_name, event.time)
+        elif event.type == 'disconnect':
+            steam_id = self.db_manager.get_player_steam_id(event.player_name)
+            player = self.players.get(steam_id)
+            if player is not None and player.present_since is not None:
+                player.seconds_played += (event.time - player.present_since).total_seconds()
+                player.present_since = None
+        elif event.type == 'kill':
+            victim = self._player(event.victim_steam_id, event.victim_name, event.time)
+            victim.deaths += 1
+            if event.attacker_steam_id != event.victim_steam_id:
+                attacker = self._player(event.attacker_steam_id, event.attacker_name, event.time)
+                attacker.kills += 1
+                attacker.headshots += event.headshot
+
+    def _open(self, event):
+        # Players still connected carry over into the new map
+        carried = {steam_id: SessionPlayer(player.name, present_since=event.time)
+                   for steam_id, player in self.players.items() if player.present_since is not None}
+        self.session_id = self.db_manager.current_sessions[self.server_id]
+        self.map_name = event.map_name
+        self.started_at = event.time
+        self.players = carried
+
+    def _close(self, ended_at):
+        if self.session_id is None:
+            return
+        for player in self.players.values():
+            if player.present_since is not None:
+                player.seconds_played += (ended_at - player.present_since).total_seconds()
+        self._write(present=False)
+        self.db_manager.end_map_session(self.session_id, ended_at.strftime(TIMESTAMP_FORMAT))
+        logging.info(f"Map session {self.session_id} on {self.map_name} ended with {len(self.players)} players")
+        if self.on_session_end is not None:
+            self.on_session_end(self.map_name, self.started_at, ended_at, self.scoreboard())
+
+    def _write(self, present):
+        self.db_manager.save_session_players(self.session_id, [
+            (steam_id, p.name, p.kills, p.deaths, p.headshots, p.seconds_played,
+             p.present_since.strftime(TIMESTAMP_FORMAT) if present and p.present_since else None)
+            for steam_id, p in self.players.items()
+        ])
+
+    def scoreboard(self):
+        return sorted(self.players.values(), key=lambda p: (p.kills, -p.deaths), reverse=True)
+
+    def save(self):
+        """Snapshot the open session so the next run can resume it."""
+        if self.session_id is not None and self.players:
+            self._write(present=True)
@@ -0,0 +1,147 @@
+import logging
+from collections import Counter
+from config import SUMMARY_TOKEN_BUDGET
+
+# Rough tokens-per-character ratio for English text and log-ish digests
+CHARS_PER_TOKEN = 4
+LONGEST_KILLS_SHOWN = 5
+MAX_SUMMARY_LEVELS = 3
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class PlayerStats:
+    __slots__ = ('name', 'kills', 'deaths', 'suicides', 'headshots', 'streak', 'best_streak', 'weapons')
+
+    def __init__(self, name):
+        self.name = name
+        self.kills = 0
+        self.deaths = 0
+        self.suicides = 0
+        self.headshots = 0
+        self.streak = 0
+        self.best_streak = 0
+        self.weapons = Counter()
+
+class EventDigest:
+    """Compact aggregate of a stream of parsed events.
+
+    Events are folded in one at a time, so the digest stays the same size
+    however many log lines arrived; only the digest is sent to the model.
+    """
+
+    def __init__(self):
+        self.players = {}
+        self.weapons = Counter()
+        self.longest_kills = []
+        self.maps = []
+        self.joined = []
+        self.left = []
+        self.total_kills = 0
+        self.event_count = 0
+
+    def _player(self, steam_id, name):
+        stats = self.players.get(steam_id)
+        if stats is None:
+            stats = self.players[steam_id] = PlayerStats(name)
+        else:
+            stats.name = name
+        return stats
+
+    def add(self, event):
+        self.event_count += 1
+        if event.type == 'kill':
+            self._add_kill(event)
+        elif event.type == 'connect':
+            self.joined.append(event.player_name)
+        elif event.type == 'disconnect':
+            self.left.append(event.player_name)
+        elif event.type == 'map_change':
+            self.maps.append(event.map_name)
+
+    def _add_kill(self, event):
+        attacker = self._player(event.attacker_steam_id, event.attacker_name)
+        victim = self._player(event.victim_steam_id, event.victim_name)
+        victim.deaths += 1
+        victim.streak = 0
+        if event.attacker_steam_id == event.victim_steam_id:
+            attacker.suicides += 1
+            return
+
+        self.total_kills += 1
+        attacker.kills += 1
+        attacker.streak += 1
+        attacker.best_streak = max(attacker.best_streak, attacker.streak)
+        attacker.weapons[event.weapon] += 1
+        self.weapons[event.weapon] += 1
+        if event.headshot:
+            attacker.headshots += 1
+
+        self.longest_kills.append((event.distance, event.attacker_name, event.victim_name, event.weapon))
+        self.longest_kills.sort(reverse=True)
+        del self.longest_kills[LONGEST_KILLS_SHOWN:]
+
+    def to_lines(self):
+        lines = [f"{self.event_count} events, {self.total_kills} kills"]
+        if self.maps:
+            lines.append(f"Maps played: {', '.join(self.maps)}")
+        if self.joined:
+            lines.append(f"Joined: {', '.join(sorted(set(self.joined)))}")
+        if self.left:
+            lines.append(f"Left: {', '.join(sorted(set(self.left)))}")
+        if self.weapons:
+            lines.append("Weapons: " + ", ".join(f"{weapon} {count}" for weapon, count in self.weapons.most_common()))
+        for distance, attacker, victim, weapon in self.longest_kills:
+            lines.append(f"Long kill: {attacker} killed {victim} with {weapon} at {distance:.1f}m")
+
+        ranked = sorted(self.players.values(), key=lambda p: (p.kills, -p.deaths), reverse=True)
+        for p in ranked:
+            headshot_pct = 100 * p.headshots / p.kills if p.kills else 0
+            top_weapon = p.weapons.most_common(1)[0][0] if p.weapons else '-'
+            line = (f"{p.name}: {p.kills}K/{p.deaths}D, best streak {p.best_streak}, "
+                    f"{headshot_pct:.0f}% headshots, top weapon {top_weapon}")
+            if p.suicides:
+                line += f", {p.suicides} suicides"
+            lines.append(line)
+        return lines
+
+class Summarizer:
+    """Turns an EventDigest into a Discord summary under a token budget.
+
+    ai is anything with generate_summary(previous_summary, new_events), e.g.
+    OpenAIHandler or a fake in tests. A digest that doesn't fit the budget is
+    split into chunks that are summarized separately and then combined,
+    repeating until the combined text fits.
+    """
+
+    def __init__(self, ai, token_budget=SUMMARY_TOKEN_BUDGET):
+        self.ai = ai
+        self.token_budget = token_budget
+
+    def _chunks(self, lines, budget):
+        chunk, size = [], 0
+        for line in lines:
+            tokens = estimate_tokens(line)
+            if chunk and size + tokens > budget:
+                yield '\n'.join(chunk)
+                chunk, size = [], 0
+            chunk.append(line)
+            size += tokens
+        if chunk:
+            yield '\n'.join(chunk)
+
+    def summarize(self, previous_summary, digest):
+        # Keep the previous summary to a quarter of the budget so new events always have room
+        previous_budget = self.token_budget // 4
+        previous_summary = previous_summary[-previous_budget * CHARS_PER_TOKEN:]
+        budget = self.token_budget - estimate_tokens(previous_summary)
+
+        lines = digest.to_lines()
+        for _ in range(MAX_SUMMARY_LEVELS):
+            if estimate_tokens('\n'.join(lines)) <= budget:
+                break
+            logging.info(f"Digest exceeds {budget} tokens, summarizing {len(lines)} lines in chunks")
+            lines = [self.ai.generate_summary('', chunk) for chunk in self._chunks(lines, budget)]
+        # Hard cap in case the model's partial summaries refused to shrink
+        new_events = '\n'.join(lines)[:budget * CHARS_PER_TOKEN]
+        return self.ai.generate_summary(previous_summary, new_events)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_manager import DatabaseManager
+from log_generator import LogGenerator
+from log_parser import LogParser
+
+
+def write_log(path, count, seed=0, mode='w'):
+    """Append count generated lines to path and return them."""
+    lines = list(LogGenerator(seed=seed).lines(count))
+    with open(path, mode, encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+    return lines
+
+
+def kill_events(lines):
+    return [event for event in LogParser.parse_lines(lines) if event.type == 'kill']
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / 'events.db')
+
+
+@pytest.fixture
+def db_manager(db_file):
+    manager = DatabaseManager(db_file)
+    yield manager
+    manager.close()
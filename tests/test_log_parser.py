@@ -0,0 +1,40 @@
+import pytest
+
+from log_generator import EDGE_CASE_NAMES
+from log_parser import LogParser
+
+PREFIX = 'L 01/02/2026 - 03:04:05: [event_logger.smx] '
+
+
+def kill_line(attacker='Harper', victim='Bob', health='87', distance='12.5'):
+    return (f'{PREFIX}Kill: {attacker} (STEAM_0:1:1) killed {victim} (STEAM_0:0:2) | Weapon: crowbar | '
+            f'Attacker Health: {health} | Distance: {distance} | Headshot: Yes')
+
+
+def test_kill_fields():
+    event = LogParser.parse_line(kill_line())
+    assert (event.attacker_name, event.attacker_steam_id, event.victim_name, event.victim_steam_id) == \
+        ('Harper', 'STEAM_0:1:1', 'Bob', 'STEAM_0:0:2')
+    assert (event.weapon, event.attacker_health, event.distance, event.headshot) == ('crowbar', 87, 12.5, True)
+
+
+@pytest.mark.parametrize('name', EDGE_CASE_NAMES)
+def test_edge_case_names(name):
+    kill = LogParser.parse_line(kill_line(attacker=name, victim=name))
+    assert (kill.attacker_name, kill.victim_name) == (name, name)
+    connect = LogParser.parse_line(f'{PREFIX}Player connected: {name} (Steam ID: STEAM_0:1:1)')
+    assert (connect.player_name, connect.steam_id) == (name, 'STEAM_0:1:1')
+    assert LogParser.parse_line(f'{PREFIX}Player disconnected: {name}').player_name == name
+
+
+@pytest.mark.parametrize('health, distance', [
+    ('-5', '12.5'), ('+5', '12.5'), ('87', 'nan'), ('87', 'inf'), ('87', '1e5'), ('87', '-1.0'),
+    ('', '12.5'), ('87', ''), ('87', '.'), ('87', '1.2.3'), ('nan', '12.5'),
+])
+def test_kill_rejects_non_numeric_fields(health, distance):
+    assert LogParser.parse_line(kill_line(health=health, distance=distance)) is None
+
+
+def test_lines_without_the_tag_or_timestamp_are_skipped():
+    assert LogParser.parse_line('L 01/02/2026 - 03:04:05: "Harper<2><STEAM_0:1:1><>" say "gg"') is None
+    assert LogParser.parse_line('garbage [event_logger.smx] Map changed to: dm_lockdown') is None
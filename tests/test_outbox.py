@@ -0,0 +1,164 @@
+import threading
+from collections import Counter
+
+import pytest
+import requests
+
+import discord_notifier
+from discord_notifier import DiscordNotifier
+from outbox import Outbox, OutboxDispatcher
+
+
+class RecordingNotifier:
+    """Stands in for DiscordNotifier; records every line it is asked to post."""
+
+    def __init__(self, results=None):
+        self.results = list(results or [])
+        self.posted = Counter()
+        self.lock = threading.Lock()
+
+    def deliver(self, content):
+        delivered = self.results.pop(0) if self.results else True
+        if delivered:
+            with self.lock:
+                self.posted.update(content.split('\n'))
+        return delivered
+
+    def close(self):
+        pass
+
+
+def queue_messages(db_manager, count):
+    notifier = Outbox(db_manager)
+    with db_manager.batch():
+        for i in range(count):
+            notifier.send(f'message {i} ' + 'x' * 200)
+
+
+def outbox_rows(db_manager):
+    db_manager.cursor.execute('SELECT attempts, sent_at IS NOT NULL, claimed_at IS NOT NULL FROM outbox ORDER BY id')
+    return db_manager.cursor.fetchall()
+
+
+def test_concurrent_dispatchers_post_each_message_once(db_manager, db_file):
+    queue_messages(db_manager, 300)
+    notifier = RecordingNotifier()
+    dispatchers = [OutboxDispatcher(db_file, notifier) for _ in range(3)]
+    threads = [threading.Thread(target=dispatcher.drain) for dispatcher in dispatchers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for dispatcher in dispatchers:
+        dispatcher.close()
+
+    assert len(notifier.posted) == 300
+    assert set(notifier.posted.values()) == {1}
+    assert all(sent and not claimed for _, sent, claimed in outbox_rows(db_manager))
+
+
+def test_claimed_rows_are_skipped_until_the_claim_expires(db_manager, db_file):
+    queue_messages(db_manager, 3)
+    first = OutboxDispatcher(db_file, RecordingNotifier())
+    second = OutboxDispatcher(db_file, RecordingNotifier())
+
+    ids, _ = first._next_batch()
+    assert len(ids) == 3
+    assert second._next_batch() == ([], '')
+
+    # A dispatcher that died holding its claim
+    with second.conn:
+        second.conn.execute("UPDATE outbox SET claimed_at = datetime('now', '-1 hour')")
+    assert second._next_batch()[0] == ids
+    first.close()
+    second.close()
+
+
+def test_failed_delivery_is_retried_up_to_max_attempts(db_manager, db_file):
+    queue_messages(db_manager, 1)
+    notifier = RecordingNotifier(results=[False, False])
+    dispatcher = OutboxDispatcher(db_file, notifier, max_attempts=3)
+
+    assert dispatcher.drain() is False
+    assert outbox_rows(db_manager) == [(1, 0, 0)]
+    assert dispatcher.pending() == 1
+    assert dispatcher.drain() is False
+    assert dispatcher.drain() is True
+    assert outbox_rows(db_manager) == [(2, 1, 0)]
+    assert len(notifier.posted) == 1
+    dispatcher.close()
+
+
+def test_message_is_dropped_after_max_attempts(db_manager, db_file):
+    queue_messages(db_manager, 1)
+    dispatcher = OutboxDispatcher(db_file, RecordingNotifier(results=[False] * 5), max_attempts=2)
+    dispatcher.drain()
+    dispatcher.drain()
+    assert dispatcher.pending() == 0
+    assert dispatcher.drain() is True
+    assert outbox_rows(db_manager) == [(2, 0, 0)]
+    dispatcher.close()
+
+
+def test_flush_wakes_the_dispatcher(db_manager, db_file):
+    notifier = RecordingNotifier()
+    dispatcher = OutboxDispatcher(db_file, notifier, poll_interval=60, wake=db_manager.outbox_committed)
+    dispatcher.start()
+    try:
+        queue_messages(db_manager, 1)
+        for _ in range(100):
+            if notifier.posted:
+                break
+            threading.Event().wait(0.05)
+        assert len(notifier.posted) == 1
+    finally:
+        dispatcher.close()
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.posts += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(discord_notifier.time, 'sleep', lambda seconds: None)
+
+
+@pytest.mark.parametrize('outcomes, delivered, posts', [
+    ([requests.ConnectionError('down'), 204], True, 2),
+    ([requests.Timeout('slow'), 503, 204], True, 3),
+    ([requests.exceptions.InvalidURL('bad'), 204], False, 1),
+    ([400, 204], False, 1),
+    ([500, 500, 500], False, 3),
+])
+def test_deliver_retries_only_transient_failures(no_sleep, outcomes, delivered, posts):
+    notifier = DiscordNotifier('https://discord.test/api/webhooks/1/x', max_retries=3)
+    notifier._session = FakeSession(outcomes)
+    assert notifier.deliver('hello') is delivered
+    assert notifier._session.posts == posts
+
+
+@pytest.mark.parametrize('url', [None, '', 'discord.test/webhook', 'ftp://discord.test/webhook'])
+def test_deliver_fails_fast_without_a_usable_url(no_sleep, url):
+    notifier = DiscordNotifier(url)
+    notifier._session = FakeSession([204])
+    assert notifier.deliver('hello') is False
+    assert notifier._session.posts == 0
@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from conftest import kill_events, write_log
+from database_manager import DatabaseManager
+from log_parser import TIMESTAMP_FORMAT
+from pipeline import Pipeline, Ingester, DatabaseSink, Sink
+
+
+class FailingSink(Sink):
+    """Raises once it has seen fail_after batches, like a crash part way through a catch-up."""
+
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.batches = 0
+
+    def end_batch(self):
+        self.batches += 1
+        if self.batches > self.fail_after:
+            raise RuntimeError("simulated crash")
+
+
+def stored_kills(db_manager):
+    db_manager.cursor.execute('SELECT timestamp, attacker_steam_id, victim_steam_id, weapon, distance FROM kills')
+    return sorted(db_manager.cursor.fetchall())
+
+
+def expected_kills(lines):
+    return sorted((event.timestamp, event.attacker_steam_id, event.victim_steam_id, event.weapon, event.distance)
+                  for event in kill_events(lines))
+
+
+def catch_up(db_file, log_file, tmp_path, batch_lines, extra_sinks=()):
+    db_manager = DatabaseManager(db_file)
+    pipeline = Pipeline(log_file, db_manager, [DatabaseSink(db_manager), *extra_sinks],
+                        str(tmp_path / 'last_processed.json'))
+    ingester = Ingester([pipeline], batch_lines=batch_lines)
+    try:
+        ingester.run_once()
+    finally:
+        ingester.close()
+        db_manager.close()
+
+
+def test_catch_up_in_batches_stores_every_kill_once(tmp_path, db_file):
+    log_file = str(tmp_path / 'server.log')
+    lines = write_log(log_file, 3000)
+
+    catch_up(db_file, log_file, tmp_path, batch_lines=50)
+    catch_up(db_file, log_file, tmp_path, batch_lines=50)
+
+    db_manager = DatabaseManager(db_file)
+    assert stored_kills(db_manager) == expected_kills(lines)
+    db_manager.close()
+
+
+def test_resume_after_crash_part_way_through_catch_up(tmp_path, db_file):
+    log_file = str(tmp_path / 'server.log')
+    lines = write_log(log_file, 3000)
+
+    with pytest.raises(RuntimeError):
+        catch_up(db_file, log_file, tmp_path, batch_lines=100, extra_sinks=[FailingSink(fail_after=7)])
+    db_manager = DatabaseManager(db_file)
+    partial = len(stored_kills(db_manager))
+    db_manager.close()
+    assert 0 < partial < len(kill_events(lines))
+
+    catch_up(db_file, log_file, tmp_path, batch_lines=100)
+
+    db_manager = DatabaseManager(db_file)
+    assert stored_kills(db_manager) == expected_kills(lines)
+    db_manager.close()
+
+
+def test_resume_after_append_and_rotation(tmp_path, db_file):
+    log_file = str(tmp_path / 'server.log')
+    lines = write_log(log_file, 1000, seed=1)
+    catch_up(db_file, log_file, tmp_path, batch_lines=64)
+
+    lines += write_log(log_file, 500, seed=2, mode='a')
+    catch_up(db_file, log_file, tmp_path, batch_lines=64)
+
+    os.rename(log_file, log_file + '.1')
+    lines += write_log(log_file, 700, seed=3)
+    catch_up(db_file, log_file, tmp_path, batch_lines=64)
+
+    db_manager = DatabaseManager(db_file)
+    assert stored_kills(db_manager) == expected_kills(lines)
+    db_manager.close()
+
+
+@pytest.mark.parametrize('batch_lines', [7, 50, 5000])
+def test_legacy_cutoff_keeps_events_sharing_a_second_across_batches(tmp_path, db_file, batch_lines):
+    log_file = str(tmp_path / 'server.log')
+    lines = write_log(log_file, 3000)
+    # Several lines per second, so batch boundaries regularly fall inside one second
+    cutoff = kill_events(lines)[100].time
+    with open(tmp_path / 'last_processed.json', 'w') as f:
+        json.dump({'last_processed_time': cutoff.isoformat()}, f)
+
+    catch_up(db_file, log_file, tmp_path, batch_lines)
+
+    db_manager = DatabaseManager(db_file)
+    expected = [kill for kill in expected_kills(lines)
+                if datetime.strptime(kill[0], TIMESTAMP_FORMAT) > cutoff]
+    assert stored_kills(db_manager) == sorted(expected)
+    db_manager.close()